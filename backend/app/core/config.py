@@ -1,13 +1,47 @@
+from pathlib import Path
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional, List
 
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+class LLMEndpointConfig(BaseModel):
+    """One OpenAI-compatible endpoint; api_key falls back to OPENAI_API_KEY."""
+    base_url: Optional[str] = None
+    model: str = "gpt-4o-mini"
+    api_key: Optional[str] = None
+    name: Optional[str] = None
+    max_concurrency: int = 4
+    timeout_s: float = 60.0
+
 class Settings(BaseSettings):
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    # backend/.env wins over a .env in the working directory.
+    model_config = SettingsConfigDict(env_file=(".env", BACKEND_DIR / ".env"), env_file_encoding="utf-8")
 
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_BASE_URL: Optional[str] = None
 
+    # JSON list, e.g. [{"base_url": "http://10.0.0.5:8000/v1", "model": "qwen2.5", "max_concurrency": 8}].
+    # When empty, a single endpoint is built from the OPENAI_* settings.
+    LLM_ENDPOINTS: List[LLMEndpointConfig] = []
+    LLM_HEALTH_INTERVAL_S: float = 30.0
+    LLM_PROBE_TIMEOUT_S: float = 10.0
+    # Stream completions and merge each row as soon as its JSON object is complete.
+    LLM_STREAM: bool = False
+
+    # Preload pandas/openpyxl, the rules file and the LLM clients in the
+    # background at startup; /ready answers 503 until that is done.
+    WARMUP_ON_STARTUP: bool = False
+
+    # Where /export writes the traces asked for with the X-Profile header
+    # (relative paths are under backend/), the sampling period, how many
+    # profiled requests may run at once and how many traces are kept.
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_S: float = 0.005
+    PROFILE_MAX_CONCURRENT: int = 2
+    PROFILE_MAX_FILES: int = 50
+
     BACKEND_API_KEY: str
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
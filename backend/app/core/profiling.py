@@ -0,0 +1,191 @@
+from __future__ import annotations
+import functools
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from .config import settings, BACKEND_DIR
+
+T = TypeVar("T")
+
+# Profile of the request being handled. Copied into threadpool workers by
+# anyio, so traced()/traced_iter() know which profile a thread works for.
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_active = threading.BoundedSemaphore(max(1, settings.PROFILE_MAX_CONCURRENT))
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler. Every `interval_s` it records the Python
+    stack of the threads currently registered with attach(), so only work
+    done for one request ends up in the trace. Output is the collapsed-stack
+    format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval_s: float = 0.005) -> None:
+        self.interval_s = interval_s
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._threads: Dict[int, int] = {}  # thread id -> nesting depth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @contextmanager
+    def attach(self) -> Iterator[None]:
+        tid = threading.get_ident()
+        with self._lock:
+            self._threads[tid] = self._threads.get(tid, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._threads[tid] == 1:
+                    del self._threads[tid]
+                else:
+                    self._threads[tid] -= 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            with self._lock:
+                wanted = set(self._threads)
+            if not wanted:
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid not in wanted:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+
+def _profile_dir() -> Path:
+    out_dir = Path(settings.PROFILE_DIR)
+    return out_dir if out_dir.is_absolute() else BACKEND_DIR / out_dir
+
+
+def _prune(out_dir: Path, keep: int) -> None:
+    files = sorted(out_dir.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        old.unlink(missing_ok=True)
+
+
+class RequestProfile:
+    """
+    One profiled request: sampler + the file its trace is written to. At most
+    PROFILE_MAX_CONCURRENT are live at once (ProfilerBusy otherwise), and only
+    the newest PROFILE_MAX_FILES traces are kept.
+    """
+
+    def __init__(self, name: str) -> None:
+        if not _active.acquire(blocking=False):
+            raise ProfilerBusy(f"{settings.PROFILE_MAX_CONCURRENT} profiled requests already running")
+        try:
+            self.dir = _profile_dir()
+            self.dir.mkdir(parents=True, exist_ok=True)
+        except BaseException:
+            _active.release()
+            raise
+        self.path = self.dir / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.folded"
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL_S).start()
+        self._lock = threading.Lock()
+        self._done = False
+
+    def activate(self) -> None:
+        """Make this the current request's profile (for traced/traced_iter)."""
+        _current.set(self)
+
+    def finish(self) -> Optional[Path]:
+        with self._lock:
+            if self._done:
+                return self.path
+            self._done = True
+        try:
+            self.sampler.stop()
+            self.path.write_text(self.sampler.folded(), encoding="utf-8")
+            _prune(self.dir, max(1, settings.PROFILE_MAX_FILES))
+        finally:
+            _active.release()
+        elapsed = time.perf_counter() - self.started
+        print(f"[profile] {self.path.name}: {self.sampler.samples} samples over {elapsed:.2f}s")
+        return self.path
+
+
+def traced(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    `fn`, registering the thread that runs it with the current request's
+    profile. Resolved when wrapping, so it also works for new threads.
+    """
+    profile = _current.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        with profile.sampler.attach():
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def traced_iter(it):
+    """Sync iterator whose next() calls are sampled for the current profile."""
+    profile = _current.get()
+    if profile is None:
+        return it
+
+    def gen():
+        source = iter(it)
+        try:
+            while True:
+                with profile.sampler.attach():
+                    try:
+                        item = next(source)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    return gen()
+
+
+async def run_in_threadpool(fn: Callable[..., T], *args, **kwargs) -> T:
+    """starlette's run_in_threadpool, sampled when the request is profiled."""
+    return await _run_in_threadpool(traced(fn), *args, **kwargs)
@@ -1,15 +1,51 @@
 from __future__ import annotations
-import os
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from .core.config import settings
 from .routers import export
-from .services.llm_service import LLMClient
-from pathlib import Path
-from dotenv import load_dotenv
-load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+from .services.llm_router import get_pool, request_probe, start_health_monitor, stop_health_monitor
 
-app = FastAPI(title="Excel Viewer & AI Modifier", version="1.0.0")
+# Heavy modules (pandas, openpyxl, pyarrow, openai) are imported on first use.
+# Measure with: python benchmarks/bench_startup.py
+_startup = {"ready": False, "warmup_ms": None, "error": ""}
+
+def warm_up() -> None:
+    """Pay the first-export costs up front: heavy imports, rules, LLM clients."""
+    import openpyxl  # noqa: F401  (pd.ExcelFile / ExcelWriter engine)
+    import pyarrow  # noqa: F401
+    from .services import transform_service, output_formats  # noqa: F401
+
+    export.load_rules()
+    get_pool()
+
+async def _run_warm_up() -> None:
+    t0 = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        _startup["error"] = repr(e)
+        print(f"[startup] warm-up failed: {e!r}")
+    _startup["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    _startup["ready"] = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_task = None
+    if settings.WARMUP_ON_STARTUP:
+        warm_task = asyncio.create_task(_run_warm_up())
+    else:
+        _startup["ready"] = True
+    start_health_monitor()
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+    stop_health_monitor()
+
+app = FastAPI(title="Excel Viewer & AI Modifier", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,39 +59,31 @@ app.add_middleware(
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the optional warm-up has finished."""
+    return JSONResponse(_startup, status_code=200 if _startup["ready"] else 503)
+
 @app.get("/llm/status")
 def llm_status(probe: bool = False):
-    llm = LLMClient()
-    status = {
-        "enabled": llm.enabled,
-        "model": llm.model if llm.enabled else "",
-        "probed": False,
-        "ok": False,
-        "error": "",
-    }
-    if not llm.enabled or not probe:
-        return status
+    """
+    Cached endpoint health from the background monitor. `probe=true` only
+    schedules a fresh round of probes; it never blocks on the model.
+    """
+    pool = get_pool()
+    if probe and pool.endpoints:
+        request_probe()
 
-    try:
-        resp = llm.client.chat.completions.create(
-            model=llm.model,
-            messages=[
-                {"role": "system", "content": "Return a JSON object with {'alive': true} only."},
-                {"role": "user", "content": '{"request":"health"}'},
-            ],
-            temperature=0,
-            response_format={"type": "json_object"},
-        )
-        text = (resp.choices[0].message.content or "").strip()
-        import orjson
-        data = orjson.loads(text)
-        status["probed"] = True
-        status["ok"] = bool(isinstance(data, dict) and data.get("alive") is True)
-        return status
-    except Exception as e:
-        status["probed"] = True
-        status["ok"] = False
-        status["error"] = repr(e)
-        return status
+    endpoints = pool.snapshot()
+    best = endpoints[0] if endpoints else {}
+    probed = any(e["last_checked"] is not None for e in endpoints)
+    return {
+        "enabled": bool(endpoints),
+        "model": best.get("model", ""),
+        "probed": probed,
+        "ok": bool(probed and best.get("healthy")),
+        "error": best.get("last_error", ""),
+        "endpoints": endpoints,
+    }
 
 app.include_router(export.router, tags=["export"])
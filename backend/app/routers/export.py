@@ -1,21 +1,31 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends
+from fastapi import APIRouter, UploadFile, File, Form, Depends, Header
 from fastapi.responses import StreamingResponse, JSONResponse
+from ..core.profiling import ProfilerBusy, RequestProfile, run_in_threadpool, traced_iter
 from ..core.security import require_api_key
 from ..services.llm_service import LLMClient
-from ..services.transform_service import (
-    df_to_records,
-    records_to_df,
-    order_df_by_rules,
+from ..services.workbook_meta import read_workbook_meta, WorkbookMetaError
+from ..services.output_formats import (
+    OUTPUT_FORMATS,
+    COLUMNAR_WRITERS,
+    CHUNK_ROWS,
+    iter_frame_chunks,
 )
 
+import anyio
 from io import BytesIO
 from pathlib import Path
-import pandas as pd
 import json
+import os
 import re
-from typing import List, Optional
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+# pandas/numpy (and transform_service, which needs them) are imported on first
+# use so the app starts without paying for them; see benchmarks/bench_startup.py.
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 router = APIRouter()
 DATA_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "sample_test3.json"
@@ -32,6 +42,10 @@ def _row_has_any_value(row: pd.Series) -> bool:
 def _count_nonempty(row: pd.Series) -> int:
     return sum(1 for v in row.tolist() if str(v).strip() != "")
 
+def _bad_name(c: str) -> bool:
+    C = (c or "").strip()
+    return (not C) or C.upper().startswith("UNNAMED")
+
 def _is_header_row(row: pd.Series, hints: List[str], need: int | None = None) -> bool:
     vals = [str(v) for v in row.tolist()]
     J = _norm(" ".join(vals))
@@ -39,12 +53,17 @@ def _is_header_row(row: pd.Series, hints: List[str], need: int | None = None) ->
     hits = sum(1 for h in hints if _norm(h) in J)
     return hits >= need
 
-def _read_excel_loose_table(raw: pd.DataFrame, min_cols: int = 2) -> pd.DataFrame:
-    header_idx: Optional[int] = None
+def _find_loose_header_idx(raw: pd.DataFrame, min_cols: int = 2) -> Optional[int]:
     for i in range(min(len(raw), 40)):
         if _count_nonempty(raw.iloc[i]) >= min_cols:
-            header_idx = i
-            break
+            return i
+    return None
+
+def _read_excel_loose_table(raw: pd.DataFrame, min_cols: int = 2) -> pd.DataFrame:
+    import pandas as pd
+    from ..services.transform_service import as_string_frame, drop_blank_rows
+
+    header_idx = _find_loose_header_idx(raw, min_cols=min_cols)
     if header_idx is None:
         return pd.DataFrame()
 
@@ -52,20 +71,11 @@ def _read_excel_loose_table(raw: pd.DataFrame, min_cols: int = 2) -> pd.DataFram
     df = raw.iloc[header_idx + 1 :].reset_index(drop=True)
     df.columns = headers
 
-    def _bad_name(c: str) -> bool:
-        C = (c or "").strip()
-        return (not C) or C.upper().startswith("UNNAMED")
     df = df.loc[:, [not _bad_name(c) for c in df.columns]]
 
-    df = df.fillna("").astype(str)
-    df = df[~df.apply(lambda r: all((str(v).strip() == "") for v in r), axis=1)].reset_index(drop=True)
-    return df
-
-def _read_excel_smart(xls: pd.ExcelFile, sheet_name: str) -> pd.DataFrame:
-    raw = pd.read_excel(xls, sheet_name=sheet_name, dtype=str, header=None)
-    if raw.empty:
-        return raw
+    return as_string_frame(drop_blank_rows(df))
 
+def _find_hinted_header_idx(raw: pd.DataFrame, sheet_name: str) -> Optional[int]:
     SN = _norm(sheet_name)
 
     if "COBERTURAS" in SN:
@@ -93,7 +103,21 @@ def _read_excel_smart(xls: pd.ExcelFile, sheet_name: str) -> pd.DataFrame:
                 break
         if header_idx is not None:
             break
+    return header_idx
+
+def _open_workbook(content: bytes) -> pd.ExcelFile:
+    import pandas as pd
+    return pd.ExcelFile(BytesIO(content))
 
+def _read_excel_smart(xls: pd.ExcelFile, sheet_name: str) -> pd.DataFrame:
+    from ..services.excel_reader import read_sheet_strings
+    from ..services.transform_service import as_string_frame, drop_blank_rows
+
+    raw = read_sheet_strings(xls, sheet_name)
+    if raw.empty:
+        return raw
+
+    header_idx = _find_hinted_header_idx(raw, sheet_name)
     if header_idx is None:
         return _read_excel_loose_table(raw, min_cols=2)
 
@@ -101,33 +125,117 @@ def _read_excel_smart(xls: pd.ExcelFile, sheet_name: str) -> pd.DataFrame:
     df = raw.iloc[header_idx + 1 :].reset_index(drop=True)
     df.columns = header_values
 
-    def _bad_name(c: str) -> bool:
-        C = (c or "").strip()
-        return (not C) or C.upper().startswith("UNNAMED")
     df = df.loc[:, [not _bad_name(c) for c in df.columns]]
 
-    df = df.fillna("").astype(str)
-    df = df[~df.apply(lambda r: all((str(v).strip() == "") for v in r), axis=1)].reset_index(drop=True)
-    return df
+    return as_string_frame(drop_blank_rows(df))
+
+def _preview_frame(preview: List[List[str]]) -> pd.DataFrame:
+    import pandas as pd
+    # Same shape pd.read_excel(header=None) gives: missing cells are NaN.
+    width = max((len(r) for r in preview), default=0)
+    nan = float("nan")
+    return pd.DataFrame(
+        [[v if v != "" else nan for v in r] + [nan] * (width - len(r)) for r in preview],
+        dtype=object,
+    )
+
+def _sheet_summary(sheet: dict) -> dict:
+    raw = _preview_frame(sheet.pop("preview"))
+    header_idx = None
+    if not raw.empty:
+        header_idx = _find_hinted_header_idx(raw, sheet["name"])
+        if header_idx is None:
+            header_idx = _find_loose_header_idx(raw, min_cols=2)
+
+    header: List[str] = []
+    if header_idx is not None:
+        header = [c for c in raw.iloc[header_idx].fillna("").astype(str).tolist() if not _bad_name(c)]
+
+    rows = sheet["rows"]
+    return {
+        **sheet,
+        "header_row": header_idx + 1 if header_idx is not None else None,
+        "header": header,
+        "data_rows": max(0, rows - header_idx - 1) if rows is not None and header_idx is not None else None,
+    }
+
+_rules_cache: tuple[float, dict] | None = None
 
 def load_rules() -> dict | None:
+    """Rules file, re-read only when its mtime changes."""
+    global _rules_cache
     try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        mtime = os.path.getmtime(DATA_PATH)
+        if _rules_cache is None or _rules_cache[0] != mtime:
+            with open(DATA_PATH, "r", encoding="utf-8") as f:
+                _rules_cache = (mtime, json.load(f))
+        return _rules_cache[1]
     except FileNotFoundError:
         return None
 
-def _stream_df(df: pd.DataFrame, original_filename: str, sheet_name: str) -> StreamingResponse:
+def _download_name(original_filename: str, output_format: str) -> str:
+    if output_format == "xlsx":
+        return f"modified_{original_filename}"
+    _, ext = OUTPUT_FORMATS[output_format]
+    return f"modified_{Path(original_filename or 'export').stem}.{ext}"
+
+def _iter_enriched_frames(
+    llm: LLMClient,
+    rules: dict,
+    df: pd.DataFrame,
+    codes: np.ndarray,
+    reps: List[dict],
+    max_rows: int = CHUNK_ROWS,
+) -> Iterable[pd.DataFrame]:
+    """
+    Enriched slices of `df`, in order, as soon as every reference value they
+    contain is known. Codes number the values by first appearance, so the
+    rows up to any position only need a prefix of `reps`.
+    """
+    import numpy as np
+    from ..services.transform_service import attach_coverages
+
+    needed = np.maximum.accumulate(codes) + 1
+    enriched: List[dict] = []
+    start = 0
+    for batch in llm.iter_transform_batches(rules=rules, rows=reps):
+        enriched.extend(batch)
+        stop = int(np.searchsorted(needed, len(enriched), side="right"))
+        while start < stop:
+            end = min(stop, start + max_rows)
+            yield attach_coverages(df.iloc[start:end], codes[start:end], enriched)
+            start = end
+
+def _stream_frames(
+    frames: Iterable[pd.DataFrame],
+    columns: List[str],
+    original_filename: str,
+    output_format: str,
+) -> StreamingResponse:
+    media_type, _ = OUTPUT_FORMATS[output_format]
+    headers = {"Content-Disposition": f'attachment; filename="{_download_name(original_filename, output_format)}"'}
+    body = COLUMNAR_WRITERS[output_format](frames, columns)
+    return StreamingResponse(traced_iter(body), media_type=media_type, headers=headers)
+
+def _stream_df(
+    df: pd.DataFrame,
+    original_filename: str,
+    sheet_name: str,
+    output_format: str = "xlsx",
+) -> StreamingResponse:
+    if output_format in COLUMNAR_WRITERS:
+        columns = [str(c) for c in df.columns]
+        return _stream_frames(iter_frame_chunks(df), columns, original_filename, output_format)
+
+    media_type, _ = OUTPUT_FORMATS[output_format]
+    headers = {"Content-Disposition": f'attachment; filename="{_download_name(original_filename, output_format)}"'}
+    import pandas as pd
+
     output = BytesIO()
     with pd.ExcelWriter(output, engine="openpyxl") as writer:
         df.to_excel(writer, index=False, sheet_name=sheet_name)
     output.seek(0)
-    headers = {"Content-Disposition": f'attachment; filename="modified_{original_filename}"'}
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers,
-    )
+    return StreamingResponse(output, media_type=media_type, headers=headers)
 
 # -------------------------------
 # Routes
@@ -139,27 +247,116 @@ def sample_data():
         return JSONResponse({"message": "No rules file found on server."}, status_code=200)
     return rules
 
+@router.post("/workbook-metadata", dependencies=[Depends(require_api_key)])
+async def workbook_metadata(file: UploadFile = File(..., description="Original .xlsx")):
+    """
+    Sheet names, sizes (from each sheet's <dimension>, or its last row when
+    the tag is missing) and detected header row, read straight from the zip
+    parts without parsing the sheet data. `rows`/`cols`/`data_rows` are null
+    only when they cannot be known (missing sheet part, no header found).
+    """
+    content = await file.read()
+    try:
+        sheets = await run_in_threadpool(read_workbook_meta, content)
+    except WorkbookMetaError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return {"filename": file.filename, "sheets": [_sheet_summary(s) for s in sheets]}
+
+class _ProfiledStreamingResponse(StreamingResponse):
+    """
+    Finishes its profile however sending ends: after the last body chunk, on
+    error, or when the client disconnects before the body is even started.
+    """
+
+    profile: RequestProfile
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self.profile.finish)
+
+def _profiled(response, profile: RequestProfile):
+    """
+    Stop the sampler once the response has been produced: after the body has
+    been sent for streamed exports (so the threadpool writers are in the
+    trace), right away for JSON errors.
+    """
+    if not isinstance(response, StreamingResponse):
+        response.headers["X-Profile-File"] = profile.path.name
+        profile.finish()
+        return response
+
+    profiled = _ProfiledStreamingResponse(
+        response.body_iterator, status_code=response.status_code, background=response.background
+    )
+    profiled.raw_headers = response.raw_headers
+    profiled.headers["X-Profile-File"] = profile.path.name
+    profiled.profile = profile
+    return profiled
+
 @router.post("/export", dependencies=[Depends(require_api_key)])
 async def export_excel(
     file: UploadFile = File(..., description="Original .xlsx"),
     sheet_name: str = Form(..., description="Sheet to transform"),
+    output_format: str = Form("xlsx", description="xlsx | csv | parquet | arrow"),
+    x_profile: Optional[str] = Header(default=None, alias="X-Profile"),
 ):
+    """
+    Transform one sheet. With an `X-Profile: 1` header the threads working for
+    this export are sampled and written to PROFILE_DIR as a collapsed-stack
+    file (flamegraph.pl, speedscope); its name comes back in `X-Profile-File`.
+    429 when PROFILE_MAX_CONCURRENT profiled exports are already running.
+    """
+    if not x_profile or x_profile.strip().lower() in ("0", "false", "no", "off"):
+        return await _export(file, sheet_name, output_format)
+    try:
+        profile = RequestProfile("export")
+    except ProfilerBusy as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    profile.activate()
+    try:
+        response = await _export(file, sheet_name, output_format)
+    except BaseException:
+        profile.finish()
+        raise
+    return _profiled(response, profile)
+
+async def _export(file: UploadFile, sheet_name: str, output_format: str):
+    output_format = (output_format or "xlsx").strip().lower()
+    if output_format not in OUTPUT_FORMATS:
+        return JSONResponse(
+            {"error": f"Unsupported output_format '{output_format}'. Available: {list(OUTPUT_FORMATS)}"},
+            status_code=400,
+        )
+
+    import pandas as pd
+    from ..services.transform_service import (
+        reference_codes,
+        attach_coverages,
+        order_df_by_rules,
+        ordered_columns,
+    )
+
     try:
         content = await file.read()
-        xls = pd.ExcelFile(BytesIO(content))
+        # Parsing and writing run in the threadpool: they block for seconds on
+        # large sheets, and only threadpool work is sampled by X-Profile.
+        xls = await run_in_threadpool(_open_workbook, content)
         if sheet_name not in xls.sheet_names:
             return JSONResponse(
                 {"error": f"Sheet '{sheet_name}' not found. Available: {xls.sheet_names}"},
                 status_code=400,
             )
 
-        df = _read_excel_smart(xls, sheet_name=sheet_name)
+        df = await run_in_threadpool(_read_excel_smart, xls, sheet_name=sheet_name)
 
         if "COBERTURAS" in _norm(sheet_name):
-            return _stream_df(df, file.filename, sheet_name)
+            return await run_in_threadpool(_stream_df, df, file.filename, sheet_name, output_format)
 
         if df.empty:
-            return _stream_df(pd.DataFrame(), file.filename, sheet_name)
+            return await run_in_threadpool(_stream_df, pd.DataFrame(), file.filename, sheet_name, output_format)
 
         rules = load_rules() or {}
 
@@ -170,16 +367,25 @@ async def export_excel(
         )
 
         if ref_col in df.columns:
-            rows = df_to_records(df)
+            df.columns = [str(c) for c in df.columns]
+            # Only one row per distinct reference value goes through the LLM;
+            # the coverages are attached back to the Arrow frame by code.
+            codes, reps = await run_in_threadpool(reference_codes, df, ref_col)
             llm = LLMClient()
-            transformed_rows = llm.transform_rows(rules=rules, rows=rows)
-            out_df = records_to_df(transformed_rows)
-            out_df.columns = [str(c) for c in out_df.columns]
-            out_df = order_df_by_rules(out_df, rules)
+            if output_format in COLUMNAR_WRITERS:
+                # Write each run of rows as soon as its coverages are known
+                # instead of waiting for the whole sheet.
+                frames = _iter_enriched_frames(llm, rules, df, codes, reps)
+                return _stream_frames(frames, ordered_columns(list(df.columns)), file.filename, output_format)
+
+            # Off the event loop so concurrent exports can share in-flight LLM calls.
+            enriched = await run_in_threadpool(llm.transform_rows, rules=rules, rows=reps)
+            out_df = await run_in_threadpool(attach_coverages, df, codes, enriched)
+            out_df = await run_in_threadpool(order_df_by_rules, out_df, rules)
         else:
             out_df = df
 
-        return _stream_df(out_df, file.filename, sheet_name)
+        return await run_in_threadpool(_stream_df, out_df, file.filename, sheet_name, output_format)
 
     except Exception as e:
         return JSONResponse({"error": f"Export failed: {e!r}"}, status_code=500)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional
+
+from .output_formats import CHUNK_ROWS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas' default na_values: read_excel(dtype=str) turns these cells into NaN.
+NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+
+
+def _cell_text(cell) -> Optional[str]:
+    """
+    pandas' openpyxl cell conversion followed by str(): "" for blanks, None
+    for error cells (missing, but they still keep their row).
+    """
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == "e":
+        return None
+    if cell.data_type == "n" and not isinstance(value, bool):
+        as_int = int(value)
+        value = as_int if as_int == value else float(value)
+    return str(value)
+
+
+def _to_arrow(rows: List[List[Optional[str]]], width: int):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    na = pa.array(NA_STRINGS, type=pa.string())
+    out = []
+    for j in range(width):
+        arr = pa.array([r[j] if j < len(r) else None for r in rows], type=pa.string())
+        out.append(pc.if_else(pc.is_in(arr, value_set=na), None, arr))
+    return out
+
+
+def read_sheet_strings(xls: pd.ExcelFile, sheet_name: str, chunk_rows: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Same frame as pd.read_excel(xls, sheet_name=..., dtype=str, header=None),
+    but built into Arrow string arrays `chunk_rows` rows at a time. pandas keeps
+    a Python object per cell for the whole sheet until it is parsed; here only
+    one chunk of them is alive, which is where the export's peak memory was.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    if xls.engine != "openpyxl":
+        return pd.read_excel(xls, sheet_name=sheet_name, dtype=str, header=None)
+
+    ws = xls.book[sheet_name]
+    if xls.book.read_only:
+        # <dimension> may be missing or wrong; pandas does the same.
+        ws.reset_dimensions()
+
+    chunks: List[tuple] = []  # (n_rows, [pa.Array per column])
+    rows: List[List[Optional[str]]] = []
+    width = 0
+    blank_run = 0  # trailing blank rows are only kept if data follows
+    for cells in ws.iter_rows():
+        row = [_cell_text(c) for c in cells]
+        while row and row[-1] == "":
+            row.pop()
+        if not row:
+            blank_run += 1
+            continue
+        rows.extend([] for _ in range(blank_run))
+        blank_run = 0
+        rows.append(row)
+        width = max(width, len(row))
+        if len(rows) >= chunk_rows:
+            chunks.append((len(rows), _to_arrow(rows, width)))
+            rows = []
+    if rows:
+        chunks.append((len(rows), _to_arrow(rows, width)))
+    if not chunks:
+        return pd.read_excel(xls, sheet_name=sheet_name, dtype=str, header=None)
+
+    columns = []
+    for j in range(width):
+        parts = [arrays[j] if j < len(arrays) else pa.nulls(n, pa.string()) for n, arrays in chunks]
+        columns.append(pa.chunked_array(parts, type=pa.string()))
+    table = pa.table(columns, names=[str(j) for j in range(width)])
+    dtype = pd.StringDtype("pyarrow", na_value=float("nan"))
+    df = table.to_pandas(types_mapper=lambda _: dtype)
+    df.columns = pd.RangeIndex(width)
+    return df
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import orjson
+
+
+class RowsStreamParser:
+    """
+    Incremental parser for completions shaped like {"rows": [{...}, {...}]}.
+    Feed it text deltas as they arrive; each call returns the row objects
+    that were completed by that delta. Anything outside the top-level
+    "rows" array is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_str = False
+        self._esc = False
+        self._str_start: Optional[int] = None
+        self._last_str: Optional[str] = None
+        self._key: Optional[str] = None
+        self._rows_level: Optional[int] = None
+        self._obj_start: Optional[int] = None
+        self.text_parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.text_parts)
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        if not delta:
+            return []
+        self.text_parts.append(delta)
+        self._buf += delta
+        out: List[Dict[str, Any]] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._str_start is not None and self._stack == ["{"]:
+                        self._last_str = buf[self._str_start : i + 1]
+                    self._str_start = None
+            elif ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch == ":" and self._stack == ["{"] and self._last_str is not None:
+                try:
+                    self._key = orjson.loads(self._last_str)
+                except orjson.JSONDecodeError:
+                    self._key = None
+                self._last_str = None
+            elif ch == "," and len(self._stack) == 1:
+                self._key = None
+            elif ch in "{[":
+                self._stack.append(ch)
+                depth = len(self._stack)
+                if ch == "[" and depth == 2 and self._stack[0] == "{" and self._key == "rows":
+                    self._rows_level = depth
+                elif ch == "{" and self._rows_level is not None and depth == self._rows_level + 1:
+                    self._obj_start = i
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                depth = len(self._stack)
+                if self._rows_level is not None:
+                    if ch == "}" and self._obj_start is not None and depth == self._rows_level:
+                        try:
+                            obj = orjson.loads(buf[self._obj_start : i + 1])
+                            if isinstance(obj, dict):
+                                out.append(obj)
+                        except orjson.JSONDecodeError:
+                            pass
+                        self._obj_start = None
+                    elif depth < self._rows_level:
+                        self._rows_level = None
+            i += 1
+
+        # Drop what can no longer be part of a pending token.
+        keep = min(p for p in (self._obj_start, self._str_start, i) if p is not None)
+        if keep:
+            self._buf = buf[keep:]
+            if self._obj_start is not None:
+                self._obj_start -= keep
+            if self._str_start is not None:
+                self._str_start -= keep
+            i -= keep
+        self._pos = i
+        return out
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Parse the whole text once the stream ended (None if not valid JSON)."""
+        try:
+            data = orjson.loads(self.text.strip())
+        except orjson.JSONDecodeError:
+            return None
+        return data if isinstance(data, dict) else None
@@ -0,0 +1,329 @@
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..core.config import settings, LLMEndpointConfig
+
+_ALPHA = 0.3            # EWMA weight of the newest sample
+_UNHEALTHY_ERROR_RATE = 0.5
+_UNHEALTHY_STREAK = 3   # consecutive failures
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether `error` says something about the endpoint (unreachable, timed
+    out, rate limited, 5xx) rather than about the request. Only those count
+    against an endpoint's health and are worth another endpoint or attempt;
+    other 4xx (bad payload, auth) would fail the same way everywhere.
+    """
+    import httpx
+    import openai
+
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 429) or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, OSError))
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible endpoint with its own client, concurrency cap and
+    health stats. Latency is tracked separately for health probes (comparable
+    across endpoints, used for routing) and for real requests (reporting).
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        model: str,
+        api_key: str,
+        name: Optional[str] = None,
+        max_concurrency: int = 4,
+        timeout_s: float = 60.0,
+    ) -> None:
+        self.name = name or f"{model}@{base_url or 'openai'}"
+        self.base_url = base_url
+        self.model = model
+        self.max_concurrency = max(1, int(max_concurrency))
+        from openai import OpenAI  # heavy; only loaded once an endpoint is configured
+
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout_s, max_retries=0)
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.latency_ms: Optional[float] = None
+        self.request_latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.failure_streak = 0
+        self.last_error = ""
+        self.last_checked: Optional[float] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate < _UNHEALTHY_ERROR_RATE and self.failure_streak < _UNHEALTHY_STREAK
+
+    def routing_latency(self) -> float:
+        for v in (self.latency_ms, self.request_latency_ms):
+            if v is not None:
+                return v
+        return 0.0  # unknown endpoints get a chance
+
+    def try_acquire(self, timeout: Optional[float] = None) -> bool:
+        ok = self._slots.acquire(timeout=timeout) if timeout else self._slots.acquire(blocking=False)
+        if ok:
+            with self._lock:
+                self.in_flight += 1
+        return ok
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def record(self, ok: bool, latency_s: float, error: Optional[BaseException] = None, probe: bool = False) -> None:
+        ms = latency_s * 1000.0
+        with self._lock:
+            if ok:
+                attr = "latency_ms" if probe else "request_latency_ms"
+                prev = getattr(self, attr)
+                setattr(self, attr, ms if prev is None else _ALPHA * ms + (1 - _ALPHA) * prev)
+                self.failure_streak = 0
+            else:
+                self.failure_streak += 1
+                self.last_error = repr(error)
+            self.error_rate = _ALPHA * (0.0 if ok else 1.0) + (1 - _ALPHA) * self.error_rate
+            if probe:
+                self.last_checked = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "base_url": self.base_url or "",
+                "model": self.model,
+                "healthy": self.healthy,
+                "latency_ms": None if self.latency_ms is None else round(self.latency_ms, 1),
+                "request_latency_ms": None if self.request_latency_ms is None else round(self.request_latency_ms, 1),
+                "error_rate": round(self.error_rate, 3),
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "last_checked": self.last_checked,
+                "last_error": self.last_error,
+            }
+
+
+class EndpointPool:
+    """
+    Routes chat completions to the fastest healthy endpoint that has a free
+    slot, failing over to the next one when a call fails retryably (see
+    is_retryable); other errors are raised as they are.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], queue_timeout_s: float = 120.0, probe_timeout_s: float = 10.0) -> None:
+        self.endpoints = endpoints
+        self.queue_timeout_s = queue_timeout_s
+        self.probe_timeout_s = probe_timeout_s
+
+    def ranked(self) -> List[Endpoint]:
+        return sorted(
+            self.endpoints,
+            key=lambda e: (not e.healthy, e.routing_latency(), e.in_flight / e.max_concurrency),
+        )
+
+    def _acquire(self, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        candidates = [e for e in self.ranked() if e not in exclude]
+        for ep in candidates:
+            if ep.try_acquire():
+                return ep
+        # Everyone is at their cap: queue on the preferred one.
+        if candidates and candidates[0].try_acquire(timeout=self.queue_timeout_s):
+            return candidates[0]
+        return None
+
+    def create(self, **kwargs: Any):
+        """chat.completions.create on the best endpoint; `model` is set per endpoint."""
+        tried: List[Endpoint] = []
+        last: Optional[BaseException] = None
+        while True:
+            ep = self._acquire(tried)
+            if ep is None:
+                raise last or RuntimeError("No LLM endpoint available")
+            t0 = time.perf_counter()
+            try:
+                resp = ep.client.chat.completions.create(model=ep.model, **kwargs)
+                ep.record(True, time.perf_counter() - t0)
+                return resp
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                ep.record(False, time.perf_counter() - t0, e)
+                print(f"[LLM] {ep.name} failed: {e!r} -> trying next endpoint")
+                tried.append(ep)
+                last = e
+            finally:
+                ep.release()
+
+    def stream(self, **kwargs: Any) -> Iterator[str]:
+        """
+        Streaming variant of create(): yields content deltas. The endpoint slot
+        is held until the stream ends; failover only happens before the first
+        delta was yielded.
+        """
+        tried: List[Endpoint] = []
+        last: Optional[BaseException] = None
+        while True:
+            ep = self._acquire(tried)
+            if ep is None:
+                raise last or RuntimeError("No LLM endpoint available")
+            t0 = time.perf_counter()
+            started = False
+            try:
+                for chunk in ep.client.chat.completions.create(model=ep.model, stream=True, **kwargs):
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        started = True
+                        yield delta
+                ep.record(True, time.perf_counter() - t0)
+                return
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                ep.record(False, time.perf_counter() - t0, e)
+                if started:
+                    raise
+                print(f"[LLM] {ep.name} failed: {e!r} -> trying next endpoint")
+                tried.append(ep)
+                last = e
+            finally:
+                ep.release()
+
+    def probe(self, ep: Endpoint) -> None:
+        t0 = time.perf_counter()
+        try:
+            ep.client.with_options(timeout=self.probe_timeout_s).chat.completions.create(
+                model=ep.model,
+                messages=[{"role": "user", "content": "ping"}],
+                max_tokens=1,
+                temperature=0,
+            )
+            ep.record(True, time.perf_counter() - t0, probe=True)
+        except Exception as e:
+            ep.record(False, time.perf_counter() - t0, e, probe=True)
+
+    def probe_all(self) -> None:
+        threads = [threading.Thread(target=self.probe, args=(ep,), daemon=True) for ep in self.endpoints]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [ep.snapshot() for ep in self.ranked()]
+
+
+class HealthMonitor:
+    """
+    Background thread probing every endpoint each `interval_s` seconds. With
+    pool=None the shared pool is built on that thread, so the openai import
+    and client setup stay off the event loop at startup.
+    """
+
+    def __init__(self, pool: Optional[EndpointPool], interval_s: float) -> None:
+        self.pool = pool
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="llm-health", daemon=True)
+
+    def start(self) -> "HealthMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        timeout = self.pool.probe_timeout_s if self.pool is not None else settings.LLM_PROBE_TIMEOUT_S
+        self._thread.join(timeout=timeout + 1)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        if self.pool is None:
+            self.pool = get_pool()
+        if not self.pool.endpoints:
+            return
+        while not self._stop.is_set():
+            self.pool.probe_all()
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+
+def _endpoint_configs() -> List[LLMEndpointConfig]:
+    if settings.LLM_ENDPOINTS:
+        return list(settings.LLM_ENDPOINTS)
+    base_url = (settings.OPENAI_BASE_URL or os.getenv("OPENAI_BASE_URL", "") or "").strip() or None
+    model = (settings.OPENAI_MODEL or os.getenv("OPENAI_MODEL", "gpt-4o-mini")).strip()
+    return [LLMEndpointConfig(base_url=base_url, model=model)]
+
+
+def build_pool() -> EndpointPool:
+    default_key = (settings.OPENAI_API_KEY or os.getenv("OPENAI_API_KEY", "") or "").strip()
+    endpoints = []
+    for cfg in _endpoint_configs():
+        api_key = (cfg.api_key or default_key).strip()
+        if not api_key:
+            continue
+        endpoints.append(Endpoint(
+            base_url=cfg.base_url,
+            model=cfg.model,
+            api_key=api_key,
+            name=cfg.name,
+            max_concurrency=cfg.max_concurrency,
+            timeout_s=cfg.timeout_s,
+        ))
+    return EndpointPool(endpoints, probe_timeout_s=settings.LLM_PROBE_TIMEOUT_S)
+
+
+_pool: Optional[EndpointPool] = None
+_monitor: Optional[HealthMonitor] = None
+_lock = threading.Lock()
+
+
+def get_pool() -> EndpointPool:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = build_pool()
+        return _pool
+
+
+def start_health_monitor(interval_s: Optional[float] = None) -> Optional[HealthMonitor]:
+    global _monitor
+    interval_s = settings.LLM_HEALTH_INTERVAL_S if interval_s is None else interval_s
+    if interval_s <= 0:
+        return None
+    with _lock:
+        if _monitor is None:
+            _monitor = HealthMonitor(_pool, interval_s).start()
+        return _monitor
+
+
+def stop_health_monitor() -> None:
+    global _monitor
+    with _lock:
+        monitor, _monitor = _monitor, None
+    if monitor is not None:
+        monitor.stop()
+
+
+def request_probe() -> None:
+    """Ask for a fresh round of probes without waiting for it."""
+    with _lock:
+        monitor = _monitor
+    if monitor is not None:
+        monitor.wake()
+    else:
+        threading.Thread(target=get_pool().probe_all, daemon=True).start()
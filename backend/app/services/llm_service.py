@@ -1,12 +1,16 @@
 from __future__ import annotations
-import os
 import time
 import random
-from typing import List, Dict, Any
+import hashlib
+import itertools
+import threading
+from typing import List, Dict, Any, Hashable, Iterable, Iterator, Optional, Tuple
 import orjson
-from openai import OpenAI
 
 from ..core.config import settings
+from ..core.profiling import traced
+from .json_stream import RowsStreamParser
+from .llm_router import EndpointPool, get_pool, is_retryable
 from .rules_utils import get_ref_col, get_coberturas_por_tipo  
 
 Row = Dict[str, Any]
@@ -17,23 +21,93 @@ def _dumps(obj: Any) -> str:
     return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
 
 
-class LLMClient:
+def _rules_hash(rules: Rules) -> str:
+    return hashlib.sha1(
+        orjson.dumps(rules, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    ).hexdigest()
+
+
+def _norm_ref(value: Any) -> str:
+    return " ".join(str(value or "").split()).upper()
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Optional[Dict[str, str]] = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, str]:
+        if not self.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an in-flight LLM call")
+        if self.error is not None:
+            raise self.error
+        return self.value or {}
+
+
+class SingleFlight:
     """
-    Enrich rows using a real OpenAI model if OPENAI_API_KEY is set.
-    Uses Chat Completions (response_format=json_object) to force strict JSON.
-    Falls back to deterministic rules if anything fails.
+    Coalesces identical in-flight work. The first caller to claim a key owns
+    it and must resolve it; everyone else claiming the same key meanwhile
+    waits on the owner's result. Keys are forgotten once resolved (no cache).
     """
 
     def __init__(self) -> None:
-        self.api_key = (getattr(settings, "OPENAI_API_KEY", "") or os.getenv("OPENAI_API_KEY", "")).strip()
-        self.model   = (getattr(settings, "OPENAI_MODEL", "gpt-4o-mini") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")).strip()
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def claim(self, keys: Iterable[Hashable]) -> Tuple[Dict[Hashable, _Call], List[Hashable]]:
+        calls: Dict[Hashable, _Call] = {}
+        owned: List[Hashable] = []
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    owned.append(key)
+                calls[key] = call
+        return calls, owned
+
+    def resolve(
+        self,
+        key: Hashable,
+        call: _Call,
+        value: Optional[Dict[str, str]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if call.done.is_set():
+            return
+        call.value, call.error = value, error
+        call.done.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
 
-        base_url_from_settings = (getattr(settings, "OPENAI_BASE_URL", None) or "") or ""
-        base_url_from_env = os.getenv("OPENAI_BASE_URL", "") or ""
-        base_url = (base_url_from_settings or base_url_from_env or "").strip() or None
 
-        self.enabled = bool(self.api_key)
-        self.client = OpenAI(api_key=self.api_key, base_url=base_url) if self.enabled else None
+_INFLIGHT = SingleFlight()
+_INFLIGHT_WAIT_S = 600.0
+
+
+class LLMClient:
+    """
+    Enrich rows using a real OpenAI model if OPENAI_API_KEY is set (or any
+    endpoint in LLM_ENDPOINTS, routed by EndpointPool).
+    Uses Chat Completions (response_format=json_object) to force strict JSON,
+    optionally streamed (LLM_STREAM) so rows are merged as they arrive.
+    Falls back to deterministic rules if anything fails.
+    """
+
+    def __init__(self, pool: Optional[EndpointPool] = None, stream: Optional[bool] = None) -> None:
+        self.pool = pool if pool is not None else get_pool()
+        self.enabled = bool(self.pool.endpoints)
+        self.model = self.pool.ranked()[0].model if self.enabled else ""
+        self.stream = settings.LLM_STREAM if stream is None else stream
 
         self.expected_new_cols = [
             "DANOS MATERIALES LIMITES",
@@ -54,13 +128,7 @@ class LLMClient:
             return self._fallback_transform(rules, rows)
 
         try:
-            batch_size = 40
-            enriched: List[Row] = []
-            for i in range(0, len(rows), batch_size):
-                chunk = rows[i : i + batch_size]
-                if not chunk:
-                    continue
-                enriched.extend(self._transform_chunk_with_llm(rules, chunk))
+            enriched = self._transform_coalesced(rules, rows)
             self.last_used_llm = True
             return enriched
         except Exception as e:
@@ -68,7 +136,102 @@ class LLMClient:
             self.last_used_llm = False
             return self._fallback_transform(rules, rows)
 
+    def iter_transform_batches(self, rules: Rules, rows: List[Row], max_batch: int = 1000) -> Iterator[List[Row]]:
+        """
+        Like transform_rows, but yields enriched rows in input order as soon as
+        they are known. Each batch is the run of consecutive rows that are ready
+        (at most `max_batch`). Rows whose LLM answer failed get the fallback.
+        """
+        if not rows:
+            return
+        if not self.enabled:
+            self.last_used_llm = False
+            for i in range(0, len(rows), max_batch):
+                yield self._fallback_transform(rules, rows[i : i + max_batch])
+            return
+
+        row_keys, representatives, calls, owned = self._claim(rules, rows)
+        if owned:
+            def _work():
+                try:
+                    self._resolve_owned(rules, owned, representatives, calls)
+                except Exception as e:
+                    print(f"[LLM] Error: {e!r} -> using deterministic fallback")
+
+            threading.Thread(target=traced(_work), name="llm-owner", daemon=True).start()
+
+        self.last_used_llm = True
+        batch: List[Row] = []
+        for key, row in zip(row_keys, rows):
+            call = calls[key]
+            if batch and (len(batch) >= max_batch or not call.done.is_set()):
+                yield batch
+                batch = []
+            try:
+                values = call.wait(_INFLIGHT_WAIT_S)
+            except Exception:
+                self.last_used_llm = False
+                batch.extend(self._fallback_transform(rules, [row]))
+                continue
+            out_row = dict(row)
+            out_row.update(values)
+            batch.append(out_row)
+        if batch:
+            yield batch
+
     # -------------------- Internals --------------------
+    def _claim(self, rules: Rules, rows: List[Row]):
+        """
+        The coverages only depend on the reference value, so the model is asked
+        once per distinct (rules, reference value). Values another request is
+        already asking for are awaited instead of requested again.
+        """
+        ref_col = get_ref_col(rules, "TIPO DE UNIDAD")
+        rules_key = _rules_hash(rules)
+        row_keys = [(rules_key, _norm_ref(row.get(ref_col, ""))) for row in rows]
+
+        representatives: Dict[Hashable, Row] = {}
+        for key, row in zip(row_keys, rows):
+            representatives.setdefault(key, row)
+
+        calls, owned = _INFLIGHT.claim(representatives)
+        return row_keys, representatives, calls, owned
+
+    def _resolve_owned(
+        self,
+        rules: Rules,
+        owned: List[Hashable],
+        representatives: Dict[Hashable, Row],
+        calls: Dict[Hashable, _Call],
+        batch_size: int = 40,
+    ) -> None:
+        try:
+            for i in range(0, len(owned), batch_size):
+                keys = owned[i : i + batch_size]
+                chunk = [representatives[k] for k in keys]
+                if self.stream:
+                    results = self._stream_chunk_with_llm(rules, chunk)
+                else:
+                    results = enumerate(self._transform_chunk_with_llm(rules, chunk))
+                for j, out in results:
+                    value = {c: out.get(c, "") for c in self.expected_new_cols}
+                    _INFLIGHT.resolve(keys[j], calls[keys[j]], value=value)
+        except BaseException as e:
+            for key in owned:
+                _INFLIGHT.resolve(key, calls[key], error=e)
+            raise
+
+    def _transform_coalesced(self, rules: Rules, rows: List[Row]) -> List[Row]:
+        row_keys, representatives, calls, owned = self._claim(rules, rows)
+        self._resolve_owned(rules, owned, representatives, calls)
+
+        merged: List[Row] = []
+        for key, row in zip(row_keys, rows):
+            out_row = dict(row)
+            out_row.update(calls[key].wait(_INFLIGHT_WAIT_S))
+            merged.append(out_row)
+        return merged
+
     def _with_retries(self, fn, tries: int = 3):
         """
         Retry simple para redes/ratelimits del LLM.
@@ -78,6 +241,8 @@ class LLMClient:
             try:
                 return fn()
             except Exception as e:
+                if not is_retryable(e):
+                    raise
                 last = e
                 time.sleep(0.5 + random.random())
         raise last
@@ -96,11 +261,7 @@ class LLMClient:
             "expected_new_cols": self.expected_new_cols,
         }
 
-    def _transform_chunk_with_llm(self, rules: Rules, rows: List[Row]) -> List[Row]:
-        assert self.client is not None
-        if not rows:
-            return []
-
+    def _chunk_messages(self, rules: Rules, rows: List[Row]) -> List[Dict[str, str]]:
         system = (
             "You are an underwriting enrichment assistant for fleet insurance.\n"
             "Given JSON 'rules' and 'rows', you must return STRICT JSON (object) with this shape:\n"
@@ -129,15 +290,28 @@ class LLMClient:
             _ = _dumps(payload)
         except Exception:
             payload = payload_original
-        
+
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": _dumps(payload)},
+        ]
+
+    def _merge_row(self, row: Row, found: Dict[str, Any]) -> Row:
+        out_row = dict(row)
+        for col in self.expected_new_cols:
+            out_row[col] = str(found.get(col, "") or "")
+        return out_row
+
+    def _transform_chunk_with_llm(self, rules: Rules, rows: List[Row]) -> List[Row]:
+        assert self.enabled
+        if not rows:
+            return []
+
+        messages = self._chunk_messages(rules, rows)
 
         def _call():
-            return self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": _dumps(payload)},
-                ],
+            return self.pool.create(
+                messages=messages,
                 temperature=0,
                 response_format={"type": "json_object"},
             )
@@ -157,12 +331,49 @@ class LLMClient:
         merged: List[Row] = []
         for i, row in enumerate(rows):
             found = next((o for o in rows_out if isinstance(o, dict) and o.get("idx") == i), {})
-            out_row = dict(row)
-            for col in self.expected_new_cols:
-                out_row[col] = str(found.get(col, "") or "")
-            merged.append(out_row)
+            merged.append(self._merge_row(row, found))
         return merged
 
+    def _stream_chunk_with_llm(self, rules: Rules, rows: List[Row]) -> Iterator[Tuple[int, Row]]:
+        """
+        Streams the completion and yields (idx, merged row) as soon as each
+        row object is complete, instead of waiting for the last token.
+        """
+        assert self.enabled
+        parser = RowsStreamParser()
+        pending = set(range(len(rows)))
+
+        messages = self._chunk_messages(rules, rows)
+
+        def _open():
+            # Retried like the buffered call, but only until the first delta:
+            # after that, rows have already been handed out.
+            deltas = self.pool.stream(
+                messages=messages,
+                temperature=0,
+                response_format={"type": "json_object"},
+            )
+            first = next(deltas, None)
+            return itertools.chain(() if first is None else (first,), deltas)
+
+        for delta in self._with_retries(_open, tries=3):
+            for found in parser.feed(delta):
+                i = found.get("idx")
+                if isinstance(i, int) and i in pending:
+                    pending.discard(i)
+                    yield i, self._merge_row(rows[i], found)
+
+        if not pending:
+            return
+        rest = sorted(pending)
+        data = parser.close()
+        if data is None or not isinstance(data.get("rows"), list):
+            print("[LLM] JSON parse error: streamed completion is not an object with 'rows' array.")
+            yield from zip(rest, self._fallback_transform(rules, [rows[i] for i in rest]))
+        else:
+            for i in rest:
+                yield i, self._merge_row(rows[i], {})
+
     def _fallback_transform(self, rules: Rules, rows: List[Row]) -> List[Row]:
         coberturas = rules.get("coberturas_por_tipo", {})
         columna_ref = (
@@ -0,0 +1,214 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+import time
+
+# pandas/pyarrow are only needed once a columnar export is written.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# format -> (media type, file extension)
+OUTPUT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+CHUNK_ROWS = 50_000
+# Arrow IPC streams are read batch by batch, so buffered rows are sent after
+# this long even when fewer than CHUNK_ROWS are ready. Parquet row groups are
+# only useful large and always wait for CHUNK_ROWS (or the end).
+IPC_FLUSH_S = 0.5
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for i in range(0, len(df), chunk_rows):
+        yield df.iloc[i : i + chunk_rows]
+
+
+class _ChunkSink:
+    """
+    Minimal writable file for pyarrow writers. Keeps the absolute position
+    (Parquet footers store offsets) while letting callers drain what has
+    been written so far.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        b = bytes(data)
+        self._parts.append(b)
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _align(chunk: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    if [str(c) for c in chunk.columns] == [str(c) for c in columns]:
+        return chunk
+    return chunk.reindex(columns=columns)
+
+
+def _arrow_schema(columns: List[str]):
+    import pyarrow as pa
+    return pa.schema([pa.field(str(c), pa.string()) for c in columns])
+
+
+def _arrow_column(col: pd.Series):
+    import pyarrow as pa
+    # Arrow-backed and categorical columns convert without going through
+    # Python objects; anything else is stringified first.
+    try:
+        arr = pa.array(col, from_pandas=True)
+        if isinstance(arr, pa.ChunkedArray):
+            # Slices of multi-chunk Arrow columns (read_sheet_strings) come back chunked.
+            arr = arr.combine_chunks()
+        return arr if arr.type == pa.string() else arr.cast(pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return pa.array(col.astype(str).tolist(), type=pa.string())
+
+
+def _arrow_batch(chunk: pd.DataFrame, schema):
+    import pyarrow as pa
+    # Positional on purpose: sheets may carry duplicated header names.
+    arrays = [_arrow_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_csv(chunks: Iterable[pd.DataFrame], columns: List[str]) -> Iterator[bytes]:
+    import pandas as pd
+
+    yield pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8")
+    for chunk in chunks:
+        if len(chunk):
+            yield _align(chunk, columns).to_csv(index=False, header=False).encode("utf-8")
+
+
+def _with_timeouts(chunks: Iterable[pd.DataFrame], timeout_s: float) -> Iterator[Optional[pd.DataFrame]]:
+    """
+    `chunks`, plus a None each time the next chunk takes longer than
+    `timeout_s`. The source is advanced in a helper thread so that waiting
+    for it (e.g. on the LLM) can time out.
+    """
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+    from ..core.profiling import traced
+
+    source = iter(chunks)
+    end = object()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ipc-source")
+    step = None
+    try:
+        while True:
+            step = executor.submit(traced(next), source, end)
+            try:
+                item = step.result(timeout=timeout_s)
+            except FutureTimeout:
+                yield None
+                item = step.result()
+            step = None
+            if item is end:
+                return
+            yield item
+    finally:
+        close = getattr(source, "close", None)
+        if close is not None:
+            if step is None or step.done():
+                close()
+            else:
+                step.add_done_callback(lambda _: close())
+        executor.shutdown(wait=False)
+
+
+def _arrow_tables(
+    chunks: Iterable[pd.DataFrame],
+    columns: List[str],
+    schema,
+    min_rows: int = CHUNK_ROWS,
+    max_wait_s: Optional[float] = None,
+):
+    """
+    Arrow tables of at least `min_rows` rows (except the last). Streamed
+    exports hand over a few rows at a time, and every write_batch would
+    otherwise become its own Parquet row group / IPC record batch. With
+    `max_wait_s`, rows are not held much longer than that either.
+    """
+    import pyarrow as pa
+
+    source = chunks if max_wait_s is None else _with_timeouts(chunks, max_wait_s)
+    pending, n, since = [], 0, 0.0
+    for chunk in source:
+        if chunk is not None and len(chunk):
+            if not pending:
+                since = time.monotonic()
+            pending.append(_arrow_batch(_align(chunk, columns), schema))
+            n += len(chunk)
+        if not pending:
+            continue
+        # None: the source has kept the pending rows waiting for max_wait_s.
+        timed_out = max_wait_s is not None and (chunk is None or time.monotonic() - since >= max_wait_s)
+        if n >= min_rows or timed_out:
+            yield pa.Table.from_batches(pending, schema).combine_chunks()
+            pending, n = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending, schema).combine_chunks()
+
+
+def iter_parquet(chunks: Iterable[pd.DataFrame], columns: List[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for table in _arrow_tables(chunks, columns, schema):
+            writer.write_table(table, row_group_size=len(table))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_arrow_ipc(chunks: Iterable[pd.DataFrame], columns: List[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    try:
+        for table in _arrow_tables(chunks, columns, schema, max_wait_s=IPC_FLUSH_S):
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+COLUMNAR_WRITERS = {
+    "csv": iter_csv,
+    "parquet": iter_parquet,
+    "arrow": iter_arrow_ipc,
+}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import re
 import unicodedata
@@ -11,14 +12,76 @@ SPANISH_NEW_COLS = [
     "ROBO TOTAL DEDUCIBLES",
 ]
 
+# Arrow-backed strings: one contiguous buffer per column instead of a Python
+# str object per cell. Low-cardinality columns (unit type, coverages) are
+# stored as categoricals on top of that.
+STRING_DTYPE = "string[pyarrow]"
+CATEGORY_MIN_ROWS = 1_000
+CATEGORY_MAX_RATIO = 0.05
+
+def as_string_frame(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.fillna("").astype(STRING_DTYPE)
+    if len(out) < CATEGORY_MIN_ROWS:
+        return out
+    limit = CATEGORY_MAX_RATIO * len(out)
+    for i in range(out.shape[1]):
+        col = out.iloc[:, i]
+        if col.nunique() <= limit:
+            out.isetitem(i, col.astype("category"))
+    return out
+
+def drop_blank_rows(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty or df.shape[1] == 0:
+        return df
+    keep = np.zeros(len(df), dtype=bool)
+    for i in range(df.shape[1]):
+        keep |= df.iloc[:, i].astype(STRING_DTYPE).str.strip().ne("").to_numpy(dtype=bool, na_value=False)
+    return df[keep].reset_index(drop=True)
+
 def df_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
     return df.fillna("").astype(str).to_dict(orient="records")
 
 def records_to_df(rows: List[Dict[str, Any]]) -> pd.DataFrame:
     if not rows:
         return pd.DataFrame()
-    df = pd.DataFrame.from_records(rows)
-    return df.fillna("").astype(str)
+    return as_string_frame(pd.DataFrame.from_records(rows))
+
+def reference_codes(df: pd.DataFrame, ref_col: str) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Codes of the reference column (numbered by first appearance) and one
+    representative row per distinct value. Enrichment only depends on the
+    reference value, so only the representatives need to leave Arrow. With a
+    repeated header the first column of that name is the reference.
+    """
+    pos = int(np.flatnonzero(df.columns == ref_col)[0])
+    ref = df.iloc[:, pos]
+    codes, _ = pd.factorize(ref, sort=False)
+    _, first_idx = np.unique(codes, return_index=True)
+    reps = df_to_records(df.iloc[first_idx])
+    if not df.columns.is_unique:
+        # to_dict keeps the last duplicate; enrich by the value grouped on.
+        for rep, value in zip(reps, ref.iloc[first_idx].fillna("").astype(str)):
+            rep[ref_col] = value
+    return codes, reps
+
+def attach_coverages(
+    df: pd.DataFrame,
+    codes: np.ndarray,
+    enriched: List[Dict[str, Any]],
+) -> pd.DataFrame:
+    """
+    Adds SPANISH_NEW_COLS to `df` from the enriched representatives (one per
+    code) as categoricals, without materializing a string per cell.
+    """
+    out = df.copy(deep=False)
+    for col in SPANISH_NEW_COLS:
+        values = [str(r.get(col, "") or "") for r in enriched]
+        cats, inverse = np.unique(np.array(values, dtype=object), return_inverse=True)
+        out[col] = pd.Categorical.from_codes(
+            inverse[codes],
+            categories=pd.Index(cats, dtype=STRING_DTYPE),
+        )
+    return out
 
 def _strip_accents(s: str) -> str:
     return "".join(
@@ -118,25 +181,32 @@ def _ensure_new_cols(df: pd.DataFrame, new_cols: List[str]) -> pd.DataFrame:
             df[c] = ""
     return df
 
-def order_df_by_rules(df: pd.DataFrame, rules: Dict[str, Any]) -> pd.DataFrame:
-    if df.empty:
-        return df
-
-    existing = list(df.columns)
+def ordered_columns(columns: List[str]) -> List[str]:
+    """Column order of the output: the new coverage columns right after NO.SERIE."""
+    existing = list(columns)
+    cols = existing + [c for c in SPANISH_NEW_COLS if c not in existing]
 
     serie_col = _resolve_column(existing, _BASE_MATCHES["NO.SERIE"])
-
-    df = _ensure_new_cols(df, SPANISH_NEW_COLS)
-
     if not serie_col:
-        return df 
+        return cols
 
-    cols = list(df.columns)
     idx = cols.index(serie_col)
 
     left  = cols[: idx + 1]
     news  = [c for c in SPANISH_NEW_COLS if c in cols]
     right = [c for c in cols if c not in left and c not in news]
 
-    ordered = left + news + right
-    return df.reindex(columns=ordered)
+    return left + news + right
+
+def order_df_by_rules(df: pd.DataFrame, rules: Dict[str, Any]) -> pd.DataFrame:
+    if df.empty:
+        return df
+
+    existing = list(df.columns)
+
+    df = _ensure_new_cols(df, SPANISH_NEW_COLS)
+
+    if not _resolve_column(existing, _BASE_MATCHES["NO.SERIE"]):
+        return df
+
+    return df.reindex(columns=ordered_columns(existing))
@@ -0,0 +1,209 @@
+from __future__ import annotations
+import posixpath
+import re
+import zipfile
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+_NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_CELL_REF = re.compile(r"^([A-Z]+)(\d+)$")
+# Raw-byte scan used when a sheet has no <dimension> (openpyxl write-only mode).
+_ROW_REF = re.compile(rb'<(?:\w+:)?row\b[^>]*?\sr="(\d+)"')
+_COL_REF = re.compile(rb'<(?:\w+:)?c\b[^>]*?\sr="([A-Z]+)\d+"')
+_SCAN_CHUNK = 1 << 20
+
+PREVIEW_ROWS = 40
+
+
+class WorkbookMetaError(ValueError):
+    pass
+
+
+def _col_to_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n - 1
+
+
+def parse_dimension(ref: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    "A1:H120" -> (120, 8). Counts span from A1 so they line up with what
+    pandas reads with header=None.
+    """
+    last = (ref or "").split(":")[-1].replace("$", "").upper()
+    m = _CELL_REF.match(last)
+    if not m:
+        return None, None
+    return int(m.group(2)), _col_to_index(m.group(1)) + 1
+
+
+def _sheet_targets(zf: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    try:
+        rels_xml = zf.read("xl/_rels/workbook.xml.rels")
+        wb_xml = zf.read("xl/workbook.xml")
+    except KeyError as e:
+        raise WorkbookMetaError(f"Not an .xlsx workbook: missing {e}") from e
+
+    rels: Dict[str, str] = {}
+    for _, el in iterparse(BytesIO(rels_xml)):
+        if el.tag == f"{_NS_PKG_REL}Relationship":
+            target = el.get("Target", "")
+            if target.startswith("/"):
+                path = target.lstrip("/")
+            else:
+                path = posixpath.normpath(posixpath.join("xl", target))
+            rels[el.get("Id", "")] = path
+
+    out: List[Tuple[str, str]] = []
+    for _, el in iterparse(BytesIO(wb_xml)):
+        if el.tag == f"{_NS_MAIN}sheet":
+            out.append((el.get("name", ""), rels.get(el.get(f"{_NS_REL}id", ""), "")))
+    return out
+
+
+def _inline_text(el) -> str:
+    return "".join(t.text or "" for t in el.iter(f"{_NS_MAIN}t"))
+
+
+def _scan_sheet(zf: zipfile.ZipFile, path: str, max_rows: int) -> Tuple[str, List[List[Any]]]:
+    """
+    Streams the sheet part and stops after `max_rows` rows. Returns the
+    <dimension> ref and the preview grid; shared strings stay as ("s", idx).
+    """
+    dimension = ""
+    grid: List[List[Any]] = []
+    if path not in zf.namelist():
+        return dimension, grid
+
+    with zf.open(path) as fh:
+        for event, el in iterparse(fh, events=("start", "end")):
+            if event == "start":
+                if el.tag == f"{_NS_MAIN}dimension":
+                    dimension = el.get("ref", "")
+                continue
+            if el.tag != f"{_NS_MAIN}row":
+                continue
+
+            r = int(el.get("r") or len(grid) + 1)
+            if r > max_rows:
+                break
+            while len(grid) < r:
+                grid.append([])
+            cells = grid[r - 1]
+            for c in el.iter(f"{_NS_MAIN}c"):
+                m = _CELL_REF.match(c.get("r", ""))
+                col = _col_to_index(m.group(1)) if m else len(cells)
+                t = c.get("t", "n")
+                v = c.find(f"{_NS_MAIN}v")
+                if t == "inlineStr":
+                    value: Any = _inline_text(c)
+                elif v is None:
+                    value = ""
+                elif t == "s":
+                    value = ("s", int(v.text or 0))
+                else:
+                    value = v.text or ""
+                while len(cells) <= col:
+                    cells.append("")
+                cells[col] = value
+            el.clear()
+    return dimension, grid
+
+
+def _scan_extent(zf: zipfile.ZipFile, path: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Last row number and widest column of a sheet part, for sheets without a
+    <dimension>. Regex over the decompressed bytes instead of parsing the XML,
+    so a 200k-row sheet costs one pass of decompression.
+    """
+    if path not in zf.namelist():
+        return None, None
+    last_row, last_col = 0, -1
+    tail = b""
+    with zf.open(path) as fh:
+        while True:
+            chunk = fh.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            buf = tail + chunk
+            # Only match tags that are complete in `buf`; the rest is carried over.
+            cut = buf.rfind(b"<")
+            if cut == -1 or buf.find(b">", cut) != -1:
+                cut = len(buf)
+            head, tail = buf[:cut], buf[cut:]
+            rows = _ROW_REF.findall(head)
+            if rows:
+                last_row = max(last_row, int(rows[-1]))
+            for letters in set(_COL_REF.findall(head)):
+                last_col = max(last_col, _col_to_index(letters.decode()))
+    return last_row, last_col + 1
+
+
+def _shared_strings(zf: zipfile.ZipFile, wanted: set) -> Dict[int, str]:
+    """Reads sharedStrings.xml only up to the highest index we need."""
+    if not wanted or "xl/sharedStrings.xml" not in zf.namelist():
+        return {}
+    top = max(wanted)
+    found: Dict[int, str] = {}
+    i = 0
+    with zf.open("xl/sharedStrings.xml") as fh:
+        for _, el in iterparse(fh):
+            if el.tag != f"{_NS_MAIN}si":
+                continue
+            if i in wanted:
+                # Skip phonetic runs (<rPh>), keep plain and rich text.
+                parts = [el.find(f"{_NS_MAIN}t")] + [r.find(f"{_NS_MAIN}t") for r in el.findall(f"{_NS_MAIN}r")]
+                found[i] = "".join((p.text or "") for p in parts if p is not None)
+            el.clear()
+            i += 1
+            if i > top:
+                break
+    return found
+
+
+def read_workbook_meta(content: bytes, preview_rows: int = PREVIEW_ROWS) -> List[Dict[str, Any]]:
+    """
+    Sheet names, sizes and the first `preview_rows` rows of each sheet,
+    without loading the sheet data. Sizes come from <dimension>, or from the
+    last <row> when a sheet has none; they are None only when the sheet part
+    is missing.
+    """
+    try:
+        zf = zipfile.ZipFile(BytesIO(content))
+    except zipfile.BadZipFile as e:
+        raise WorkbookMetaError("Not an .xlsx workbook (invalid zip container)") from e
+
+    with zf:
+        scanned = []
+        wanted: set = set()
+        for name, path in _sheet_targets(zf):
+            dimension, grid = _scan_sheet(zf, path, preview_rows)
+            for row in grid:
+                wanted.update(v[1] for v in row if isinstance(v, tuple))
+            rows, cols = parse_dimension(dimension)
+            if rows is None:
+                rows, cols = _scan_extent(zf, path)
+            scanned.append((name, dimension, rows, cols, grid))
+
+        strings = _shared_strings(zf, wanted)
+
+    sheets: List[Dict[str, Any]] = []
+    for index, (name, dimension, rows, cols, grid) in enumerate(scanned):
+        preview = [
+            [strings.get(v[1], "") if isinstance(v, tuple) else v for v in row]
+            for row in grid
+        ]
+        sheets.append({
+            "name": name,
+            "index": index,
+            "dimension": dimension,
+            "rows": rows,
+            "cols": cols,
+            "preview": preview,
+        })
+    return sheets
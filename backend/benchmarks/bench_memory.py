@@ -0,0 +1,223 @@
+"""
+Peak RSS of a whole export (read -> transform -> write) on a real xlsx
+workbook, with each of the memory changes switched on one at a time:
+
+    baseline     pd.read_excel, object strings, every row enriched as a dict
+    dedup        + one enrichment per distinct reference value, attached by code
+    arrow-dtype  + Arrow-backed strings / categoricals after parsing
+    arrow        + sheet parsed straight into Arrow chunks (read_sheet_strings)
+
+Each mode runs in its own subprocess on the same file (generated once with
+openpyxl's write-only mode and cached). Peaks are reported on top of the
+process after imports and after the upload bytes are in memory, cumulative
+per stage: the "write" column is the peak of the whole export.
+
+    python benchmarks/bench_memory.py --rows 1000000
+    python benchmarks/bench_memory.py --rows 1000000 --output-format parquet
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("BACKEND_API_KEY", "bench")
+
+UNITS = ["TRACTO", "TANQUE", "DOLLY", "REMOLQUE", "TR FREIGHTLINER", "RM TANQ 31,500 LTS"]
+SHEET = "PRESENTACION 1"
+MODES = ["baseline", "dedup", "arrow-dtype", "arrow"]
+
+
+def _peak_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_workbook(path: str, rows: int) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET)
+    ws.append(["RELACION DE UNIDADES"])
+    ws.append([])
+    ws.append(["TIPO DE UNIDAD", "Desci.", "MOD", "NO.SERIE", "PLACAS"])
+    for i in range(rows):
+        ws.append([UNITS[i % len(UNITS)], f"DESCRIPCION UNIDAD {i % 5000}", 2000 + i % 26,
+                   f"3AKJHPDV7NS{i:08d}", f"P{i:07d}"])
+    wb.save(path)
+
+
+def _obj(df):
+    # pandas < 3 `.astype(str)` result: one Python str per cell.
+    return df.fillna("").astype(str).astype(object)
+
+
+def _read_object(xls):
+    import pandas as pd
+    from app.routers.export import _find_hinted_header_idx
+
+    raw = pd.read_excel(xls, sheet_name=SHEET, dtype=str, header=None)
+    header_idx = _find_hinted_header_idx(raw, SHEET)
+    df = raw.iloc[header_idx + 1 :].reset_index(drop=True)
+    df.columns = raw.iloc[header_idx].fillna("").astype(str).tolist()
+    df = _obj(df)
+    blank = (df.apply(lambda s: s.str.strip()) == "").all(axis=1)  # vectorized stand-in for the row lambda
+    return df[~blank].reset_index(drop=True)
+
+
+def _read_arrow(xls, chunked: bool):
+    import pandas as pd
+    from app.routers import export
+    from app.services import excel_reader
+
+    if not chunked:
+        # State before the Arrow reader: pandas parses, then as_string_frame converts.
+        excel_reader.read_sheet_strings = lambda x, s, **_: pd.read_excel(x, sheet_name=s, dtype=str, header=None)
+    return export._read_excel_smart(xls, SHEET)
+
+
+def _enrich(rules, rows):
+    # What /export does without an LLM key.
+    from app.services.llm_service import LLMClient
+    return LLMClient()._fallback_transform(rules, rows)
+
+
+def _transform_baseline(df, rules):
+    import pandas as pd
+    from app.services.transform_service import order_df_by_rules
+
+    rows = _enrich(rules, _obj(df).to_dict(orient="records"))
+    return order_df_by_rules(_obj(pd.DataFrame.from_records(rows)), rules)
+
+
+def _transform_dedup_object(df, rules):
+    import numpy as np
+    import pandas as pd
+    from app.services.transform_service import SPANISH_NEW_COLS, order_df_by_rules
+
+    codes, uniques = pd.factorize(df["TIPO DE UNIDAD"])
+    first = np.unique(codes, return_index=True)[1]
+    reps = _enrich(rules, [df.iloc[i].to_dict() for i in first])
+    out = df.copy()
+    for col in SPANISH_NEW_COLS:
+        out[col] = np.array([r.get(col, "") for r in reps], dtype=object)[codes]
+    return order_df_by_rules(out, rules)
+
+
+def _transform_arrow(df, rules):
+    from app.services.transform_service import reference_codes, attach_coverages, order_df_by_rules
+
+    codes, reps = reference_codes(df, "TIPO DE UNIDAD")
+    return order_df_by_rules(attach_coverages(df, codes, _enrich(rules, reps)), rules)
+
+
+def _write(df, output_format: str) -> int:
+    import pandas as pd
+    from app.services.output_formats import COLUMNAR_WRITERS, iter_frame_chunks
+
+    if output_format == "xlsx":
+        # What _stream_df does.
+        out = BytesIO()
+        with pd.ExcelWriter(out, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name=SHEET)
+        return out.tell()
+    columns = [str(c) for c in df.columns]
+    return sum(len(b) for b in COLUMNAR_WRITERS[output_format](iter_frame_chunks(df), columns))
+
+
+def run_one(mode: str, path: str, output_format: str) -> dict:
+    import gc
+    import pandas as pd
+    import pyarrow  # noqa: F401  (imported up front so it is not counted as pipeline memory)
+    import openpyxl  # noqa: F401
+    import app.routers.export  # noqa: F401
+
+    with open(os.path.join(os.path.dirname(__file__), "..", "data", "sample_test3.json"), encoding="utf-8") as f:
+        rules = json.load(f)
+    with open(path, "rb") as f:
+        content = f.read()
+
+    gc.collect()
+    start = _peak_mb()
+    peaks, seconds = {}, {}
+
+    t0 = time.perf_counter()
+    xls = pd.ExcelFile(BytesIO(content))
+    if mode in ("baseline", "dedup"):
+        df = _read_object(xls)
+    else:
+        df = _read_arrow(xls, chunked=mode == "arrow")
+    peaks["read"], seconds["read"] = _peak_mb() - start, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    transform = {"baseline": _transform_baseline, "dedup": _transform_dedup_object}.get(mode, _transform_arrow)
+    out = transform(df, rules)
+    del df
+    peaks["transform"], seconds["transform"] = _peak_mb() - start, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    size = _write(out, output_format)
+    peaks["write"], seconds["write"] = _peak_mb() - start, time.perf_counter() - t0
+
+    return {
+        "mode": mode,
+        "rows": len(out),
+        "peak_mb": {k: round(v, 1) for k, v in peaks.items()},
+        "seconds": {k: round(v, 1) for k, v in seconds.items()},
+        "output_mb": round(size / 2**20, 1),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--output-format", default="xlsx", choices=["xlsx", "csv", "parquet", "arrow"])
+    ap.add_argument("--workbook", help="input .xlsx; default is generated once into the temp dir")
+    ap.add_argument("--modes", default=",".join(MODES))
+    ap.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    path = args.workbook or os.path.join(tempfile.gettempdir(), f"bench_export_{args.rows}.xlsx")
+    if args.mode:
+        print(json.dumps(run_one(args.mode, path, args.output_format)))
+        return
+
+    if not os.path.exists(path):
+        print(f"writing {args.rows} rows to {path} ...", flush=True)
+        build_workbook(path, args.rows)
+    print(f"input: {path} ({os.path.getsize(path) / 2**20:.1f} MB), output: {args.output_format}\n", flush=True)
+
+    results = {}
+    print(f"{'mode':<12} {'rows':>8} {'read MB':>8} {'transform MB':>13} {'write MB':>9}   seconds (read/transform/write)")
+    for mode in args.modes.split(","):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--workbook", path, "--output-format", args.output_format],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{mode:<12} failed (exit {proc.returncode}): {proc.stderr.strip().splitlines()[-1:] or ''}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        results[mode] = r
+        p, s = r["peak_mb"], r["seconds"]
+        print(f"{mode:<12} {r['rows']:>8} {p['read']:>8} {p['transform']:>13} {p['write']:>9}"
+              f"   {s['read']}/{s['transform']}/{s['write']}", flush=True)
+
+    print()
+    steps = [("dedup", "baseline", "dedup"), ("Arrow dtypes", "dedup", "arrow-dtype"),
+             ("Arrow reader", "arrow-dtype", "arrow"), ("total", "baseline", "arrow")]
+    for label, before, after in steps:
+        if before in results and after in results:
+            a, b = results[before]["peak_mb"]["write"], results[after]["peak_mb"]["write"]
+            print(f"{label:<13} {before} -> {after}: export peak {a:.0f} -> {b:.0f} MB ({a / b:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
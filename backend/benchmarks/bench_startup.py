@@ -0,0 +1,150 @@
+"""
+Cold-start budget: time to `import app.main` and the import time of each
+module, from `python -X importtime`. Also times the optional warm-up hook
+(WARMUP_ON_STARTUP) and the time from spawning uvicorn until /health
+answers, with and without an LLM key (the lifespan must not build the LLM
+clients on the event loop).
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 500 --top 15
+
+Exits with status 1 when the median import time is over --budget-ms or a
+median time to first response is over --serve-budget-ms.
+"""
+from __future__ import annotations
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+HEAVY = ("pandas", "numpy", "openpyxl", "pyarrow", "openai")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("BACKEND_API_KEY", "bench")
+    return env
+
+
+def _run(code: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(cmd, cwd=BACKEND, env=_env(), capture_output=True, text=True, check=True)
+
+
+def import_profile() -> dict:
+    """module -> (self_us, cumulative_us) for one cold `import app.main`."""
+    proc = _run("import app.main", importtime=True)
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cum_us, name = (p.strip() for p in line.replace("import time:", "|", 1).split("|"))
+        out[name] = (int(self_us), int(cum_us))
+    return out
+
+
+def wall_ms(code: str) -> float:
+    timed = (
+        "import time; t0 = time.perf_counter()\n"
+        f"{code}\n"
+        "print((time.perf_counter() - t0) * 1000)"
+    )
+    return float(_run(timed).stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_ms(extra_env: dict, timeout_s: float = 30.0) -> float:
+    """Spawn uvicorn and poll /health; ms until the first 200."""
+    port = _free_port()
+    env = {**_env(), **extra_env}
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout_s:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - t0) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"server did not answer within {timeout_s}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+# A key pointing at a closed port: the pool and its clients are built, probes fail fast.
+SERVE_CASES = {
+    "no LLM key": {"OPENAI_API_KEY": ""},
+    "LLM key, health monitor on": {"OPENAI_API_KEY": "sk-bench", "OPENAI_BASE_URL": "http://127.0.0.1:9/v1"},
+    "LLM key, monitor off": {"OPENAI_API_KEY": "sk-bench", "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+                             "LLM_HEALTH_INTERVAL_S": "0"},
+}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=500.0)
+    ap.add_argument("--serve-budget-ms", type=float, default=1500.0)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    imports = [wall_ms("import app.main") for _ in range(args.runs)]
+    warmups = [wall_ms("import app.main\napp.main.warm_up()") for _ in range(max(1, args.runs // 2))]
+    loaded = _run(
+        "import sys, app.main; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY,)
+    ).stdout.strip()
+
+    serves = {
+        name: [serve_ms(env) for _ in range(max(1, args.runs // 2))] for name, env in SERVE_CASES.items()
+    }
+
+    profile = import_profile()
+    by_package = defaultdict(int)
+    for name, (self_us, _) in profile.items():
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import app.main   median {statistics.median(imports):7.1f} ms   (runs: {', '.join(f'{x:.0f}' for x in imports)})")
+    print(f"import + warm_up  median {statistics.median(warmups):7.1f} ms")
+    print(f"heavy modules loaded at import: {loaded or 'none'}")
+    for name, times in serves.items():
+        print(f"spawn uvicorn -> first /health 200, {name:<27} median {statistics.median(times):7.1f} ms")
+
+    print(f"\nTop {args.top} modules by cumulative import time")
+    for name, (self_us, cum_us) in sorted(profile.items(), key=lambda kv: -kv[1][1])[: args.top]:
+        print(f"  {cum_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f})  {name}")
+
+    print(f"\nTop {args.top} packages by self import time")
+    for pkg, us in sorted(by_package.items(), key=lambda kv: -kv[1])[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {pkg}")
+
+    failed = False
+    median = statistics.median(imports)
+    if median > args.budget_ms:
+        print(f"\nFAIL: import time {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    slowest = max(serves, key=lambda name: statistics.median(serves[name]))
+    serve = statistics.median(serves[slowest])
+    if serve > args.serve_budget_ms:
+        print(f"FAIL: time to first response ({slowest}) {serve:.1f} ms is over the {args.serve_budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"\nOK: import time {median:.1f} ms (budget {args.budget_ms:.0f}), "
+          f"time to first response {serve:.1f} ms (budget {args.serve_budget_ms:.0f})")
+
+
+if __name__ == "__main__":
+    main()
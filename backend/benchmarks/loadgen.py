@@ -0,0 +1,172 @@
+"""
+Load generator for POST /export: concurrent uploads of synthetic workbooks,
+reported as p50/p95/p99 latency and throughput.
+
+By default the app is started in-process (uvicorn on a free port) against the
+stub LLM from tests/stub_llm.py, so no API key or network is needed:
+
+    python benchmarks/loadgen.py --requests 200 --concurrency 16 --rows 2000
+    python benchmarks/loadgen.py --output-format parquet --stub-delay 0.5
+
+Pass --url to load an already running server instead (it uses whatever LLM
+that server is configured with). --distinct-units gives every upload its own
+unit names so concurrent exports do not share in-flight LLM calls.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from io import BytesIO
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND)
+
+UNITS = ["TRACTO", "TANQUE", "DOLLY", "REMOLQUE", "TR FREIGHTLINER", "RM TANQ 31,500 LTS"]
+SHEET = "PRESENTACION 1"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def build_workbook(rows: int, tag: str = "") -> bytes:
+    import pandas as pd
+
+    df = pd.DataFrame(
+        {
+            "TIPO DE UNIDAD": [UNITS[i % len(UNITS)] + tag for i in range(rows)],
+            "Desci.": [f"DESCRIPCION UNIDAD {i % 500}" for i in range(rows)],
+            "MOD": [str(2000 + i % 26) for i in range(rows)],
+            "NO.SERIE": [f"3AKJHPDV7NS{i:08d}" for i in range(rows)],
+            "PLACAS": [f"P{i:07d}" for i in range(rows)],
+        }
+    )
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name=SHEET, index=False)
+    return buf.getvalue()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_app(stub_delay: float, stream: bool, api_key: str):
+    """Stub LLM + uvicorn in background threads; returns (url, stub, stop)."""
+    from tests.stub_llm import StubLLMServer
+
+    stub = StubLLMServer(delay=stub_delay).start()
+    # Settings are read when app.main is imported.
+    os.environ["BACKEND_API_KEY"] = api_key
+    os.environ["LLM_ENDPOINTS"] = json.dumps(
+        [{"base_url": stub.base_url, "model": stub.model, "api_key": "stub", "max_concurrency": 64}]
+    )
+    os.environ["LLM_STREAM"] = "true" if stream else "false"
+    os.environ.setdefault("LLM_HEALTH_INTERVAL_S", "3600")
+
+    import uvicorn
+    from app.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop() -> None:
+        server.should_exit = True
+        thread.join()
+        stub.stop()
+
+    return f"http://127.0.0.1:{port}", stub, stop
+
+
+async def run_load(url: str, payloads: list, requests: int, concurrency: int,
+                   output_format: str, api_key: str, timeout: float) -> dict:
+    import httpx
+
+    latencies, errors, sizes = [], [], []
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def one(i: int) -> None:
+            async with sem:
+                files = {"file": (f"load-{i}.xlsx", payloads[i % len(payloads)], XLSX)}
+                data = {"sheet_name": SHEET, "output_format": output_format}
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/export", headers={"X-API-KEY": api_key}, files=files, data=data)
+                    body = r.content
+                except httpx.HTTPError as e:
+                    errors.append(repr(e))
+                    return
+                if r.status_code != 200:
+                    errors.append(f"{r.status_code}: {body[:200]!r}")
+                    return
+                latencies.append(time.perf_counter() - t0)
+                sizes.append(len(body))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - t0
+
+    return {"latencies": latencies, "errors": errors, "sizes": sizes, "wall": wall}
+
+
+def report(result: dict, requests: int, concurrency: int) -> None:
+    lat = sorted(result["latencies"])
+    ok, wall = len(lat), result["wall"]
+    print(f"requests {requests}  concurrency {concurrency}  ok {ok}  errors {len(result['errors'])}  wall {wall:.2f}s")
+    if ok:
+        q = statistics.quantiles(lat, n=100, method="inclusive") if ok > 1 else [lat[0]] * 99
+        print(f"latency ms   p50 {q[49] * 1000:8.1f}   p95 {q[94] * 1000:8.1f}   p99 {q[98] * 1000:8.1f}"
+              f"   max {lat[-1] * 1000:8.1f}   mean {statistics.fmean(lat) * 1000:8.1f}")
+        print(f"throughput   {ok / wall:8.2f} req/s   {sum(result['sizes']) / wall / 2**20:8.2f} MiB/s out")
+    for err in result["errors"][:5]:
+        print(f"  error: {err}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target server; default starts the app in-process with a stub LLM")
+    ap.add_argument("--api-key", default=os.environ.get("BACKEND_API_KEY", "loadgen"))
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--rows", type=int, default=1000, help="rows per synthetic workbook")
+    ap.add_argument("--output-format", default="xlsx", choices=["xlsx", "csv", "parquet", "arrow"])
+    ap.add_argument("--distinct-units", action="store_true")
+    ap.add_argument("--stub-delay", type=float, default=0.2, help="stub LLM latency in seconds")
+    ap.add_argument("--stream", action="store_true", help="in-process app uses LLM_STREAM")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    args = ap.parse_args()
+
+    variants = args.requests if args.distinct_units else 1
+    payloads = [build_workbook(args.rows, f" #{i}" if args.distinct_units else "") for i in range(variants)]
+
+    stub, stop = None, None
+    url = args.url
+    if not url:
+        url, stub, stop = start_local_app(args.stub_delay, args.stream, args.api_key)
+    try:
+        result = asyncio.run(run_load(url, payloads, args.requests, args.concurrency,
+                                      args.output_format, args.api_key, args.timeout))
+    finally:
+        if stop:
+            stop()
+
+    report(result, args.requests, args.concurrency)
+    if stub is not None:
+        print(f"stub LLM calls {stub.calls}")
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -78,3 +78,38 @@ def coverages_sheet_bytes() -> BytesIO:
         df.to_excel(w, index=False, sheet_name="COBERTURAS")
     out.seek(0)
     return out
+
+@pytest.fixture()
+def make_stub_llm():
+    from stub_llm import StubLLMServer
+
+    servers = []
+
+    def _make(delay: float = 0.0, **kwargs) -> StubLLMServer:
+        server = StubLLMServer(delay=delay, **kwargs).start()
+        servers.append(server)
+        return server
+
+    yield _make
+    for server in servers:
+        server.stop()
+
+@pytest.fixture()
+def stub_llm(make_stub_llm):
+    return make_stub_llm(delay=0.3)
+
+@pytest.fixture()
+def stub_pool():
+    from app.services.llm_router import Endpoint, EndpointPool
+
+    def _pool(*servers, max_concurrency: int = 4) -> EndpointPool:
+        return EndpointPool(
+            [
+                Endpoint(base_url=s.base_url, model=s.model, api_key="test",
+                         name=f"stub-{i}", max_concurrency=max_concurrency)
+                for i, s in enumerate(servers)
+            ],
+            probe_timeout_s=2.0,
+        )
+
+    return _pool
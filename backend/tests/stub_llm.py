@@ -0,0 +1,153 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.transform_service import enrich_spanish_rules, SPANISH_NEW_COLS
+
+
+class StubLLMServer:
+    """
+    Local OpenAI-compatible /chat/completions endpoint. Answers with the
+    deterministic coverages for each row it receives, after `delay` seconds.
+    With stream=True the answer is sent as SSE pieces of `piece_size`
+    characters, `piece_delay` seconds apart. The first `fail_first` requests
+    are answered with `fail_status` (429 by default).
+    """
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        model: str = "stub-model",
+        piece_size: int = 16,
+        piece_delay: float = 0.0,
+        fail_first: int = 0,
+        fail_status: int = 429,
+    ) -> None:
+        self.delay = delay
+        self.model = model
+        self.piece_size = piece_size
+        self.piece_delay = piece_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.calls = 0
+        self.requests: list = []
+        self.finished_at: list = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.requests = []
+            self.finished_at = []
+
+    def answer(self, body: dict) -> str:
+        payload = json.loads(body["messages"][-1]["content"])
+        rules = payload.get("rules") or {}
+        rows_out = []
+        for row in payload.get("rows", []):
+            enriched = enrich_spanish_rules(row, rules)
+            rows_out.append({"idx": row.get("idx"), **{c: enriched.get(c, "") for c in SPANISH_NEW_COLS}})
+        return json.dumps({"rows": rows_out})
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.calls += 1
+                    stub.requests.append(body)
+                    failing = stub.calls <= stub.fail_first
+                if failing:
+                    self._send_error(stub.fail_status, "stub failure")
+                    return
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                content = stub.answer(body) if "rows" in body["messages"][-1]["content"] else '{"alive": true}'
+                if body.get("stream"):
+                    self._send_stream(content)
+                else:
+                    self._send_json(content)
+
+            def _send_error(self, status: int, message: str) -> None:
+                kind = "rate_limit_error" if status == 429 else "invalid_request_error"
+                data = json.dumps({"error": {"message": message, "type": kind}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i in range(0, len(content), stub.piece_size):
+                    chunk = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": stub.model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": content[i : i + stub.piece_size]},
+                            "finish_reason": None,
+                        }],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    if stub.piece_delay:
+                        time.sleep(stub.piece_delay)
+                with stub._lock:
+                    stub.finished_at.append(time.perf_counter())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _send_json(self, content: str) -> None:
+                data = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": stub.model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode()
+                with stub._lock:
+                    stub.finished_at.append(time.perf_counter())
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import pytest
 import pandas as pd
 from io import BytesIO
 
@@ -41,3 +42,255 @@ def test_export_with_coverages_sheet_allows_empty_output(
     data = {"sheet_name": "COBERTURAS"}
     r = client.post("/export", headers=api_headers, files=files, data=data)
     assert r.status_code == 200 
+
+NEW_COLS = [
+    "DANOS MATERIALES LIMITES",
+    "DANOS MATERIALES DEDUCIBLES",
+    "ROBO TOTAL LIMITES",
+    "ROBO TOTAL DEDUCIBLES",
+]
+
+def _post_vehicles(client, api_headers, excel_bytes, **extra):
+    files = {
+        "file": ("vehicles.xlsx", excel_bytes.getvalue(),
+                 "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    }
+    data = {"sheet_name": "PRESENTACION 1", **extra}
+    return client.post("/export", headers=api_headers, files=files, data=data)
+
+def test_export_csv_keeps_rules_column_order(client, api_headers, sample_vehicle_excel_bytes):
+    r = _post_vehicles(client, api_headers, sample_vehicle_excel_bytes, output_format="csv")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert 'filename="modified_vehicles.csv"' in r.headers["content-disposition"]
+
+    df = pd.read_csv(BytesIO(r.content), dtype=str, keep_default_na=False)
+    cols = list(df.columns)
+    i = cols.index("NO.SERIE")
+    assert cols[i + 1 : i + 5] == NEW_COLS
+    assert len(df) == 3
+    assert df.loc[0, "DANOS MATERIALES DEDUCIBLES"] == "10 %"
+
+def test_export_parquet_and_arrow_roundtrip(client, api_headers, sample_vehicle_excel_bytes):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    r = _post_vehicles(client, api_headers, sample_vehicle_excel_bytes, output_format="parquet")
+    assert r.status_code == 200
+    table = pq.read_table(BytesIO(r.content))
+    assert table.num_rows == 3
+    assert table.column_names[4:8] == NEW_COLS
+
+    r = _post_vehicles(client, api_headers, sample_vehicle_excel_bytes, output_format="arrow")
+    assert r.status_code == 200
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.num_rows == 3
+    assert table.column_names[4:8] == NEW_COLS
+
+@pytest.mark.parametrize("output_format", ["xlsx", "csv", "parquet", "arrow"])
+def test_export_with_duplicate_reference_header(client, api_headers, output_format):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "PRESENTACION 1"
+    ws.append(["TIPO DE UNIDAD", "MOD", "TIPO DE UNIDAD", "NO.SERIE"])
+    ws.append(["TRACTO", "2022", "X", "AAA"])
+    ws.append(["TANQUE", "2023", "X", "BBB"])
+    ws.append(["TRACTO", "2024", "Y", "CCC"])
+    buf = BytesIO()
+    wb.save(buf)
+
+    r = _post_vehicles(client, api_headers, buf, output_format=output_format)
+    assert r.status_code == 200, r.text
+    if output_format == "xlsx":
+        df = pd.read_excel(BytesIO(r.content), dtype=str)
+    elif output_format == "csv":
+        df = pd.read_csv(BytesIO(r.content), dtype=str)
+    elif output_format == "parquet":
+        import pyarrow.parquet as pq
+        df = pq.ParquetFile(BytesIO(r.content)).read().to_pandas()
+    else:
+        import pyarrow as pa
+        df = pa.ipc.open_stream(r.content).read_pandas()
+    assert len(df) == 3
+    # Coverages follow the first TIPO DE UNIDAD column.
+    assert df["DANOS MATERIALES DEDUCIBLES"].astype(str).tolist() == ["10 %", "5 %", "10 %"]
+
+def test_export_rejects_unknown_output_format(client, api_headers, sample_vehicle_excel_bytes):
+    r = _post_vehicles(client, api_headers, sample_vehicle_excel_bytes, output_format="ods")
+    assert r.status_code == 400
+
+def _fleet_xlsx(rows: int) -> BytesIO:
+    units = ["TRACTO", "TANQUE", "DOLLY"]
+    df = pd.DataFrame({
+        "TIPO DE UNIDAD": [units[i % 3] for i in range(rows)],
+        "MOD": [str(2000 + i % 20) for i in range(rows)],
+        "NO.SERIE": [f"SER{i:06d}" for i in range(rows)],
+    })
+    out = BytesIO()
+    with pd.ExcelWriter(out, engine="openpyxl") as w:
+        df.to_excel(w, index=False, sheet_name="PRESENTACION 1")
+    return out
+
+def test_export_profile_header_samples_only_this_export(client, api_headers, tmp_path, monkeypatch):
+    import threading
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_S", 0.001)
+
+    stop = threading.Event()
+
+    def _unrelated_busy_work():
+        while not stop.is_set():
+            sum(range(1000))
+
+    other = threading.Thread(target=_unrelated_busy_work)
+    other.start()
+    try:
+        r = _post_vehicles(client, {**api_headers, "X-Profile": "1"}, _fleet_xlsx(3000), output_format="csv")
+    finally:
+        stop.set()
+        other.join()
+    assert r.status_code == 200
+    assert len(pd.read_csv(BytesIO(r.content), dtype=str)) == 3000
+
+    trace = (tmp_path / r.headers["X-Profile-File"]).read_text(encoding="utf-8")
+    lines = trace.splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+    assert "_read_excel_smart" in trace
+    assert "_unrelated_busy_work" not in trace
+
+    r = _post_vehicles(client, api_headers, _fleet_xlsx(3), output_format="csv")
+    assert "X-Profile-File" not in r.headers
+    assert len(list(tmp_path.iterdir())) == 1
+
+def test_export_profiles_are_capped(client, api_headers, sample_vehicle_excel_bytes, tmp_path, monkeypatch):
+    from app.core.config import settings
+    from app.core.profiling import RequestProfile
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_MAX_FILES", 2)
+
+    running = [RequestProfile("busy") for _ in range(settings.PROFILE_MAX_CONCURRENT)]
+    r = _post_vehicles(client, {**api_headers, "X-Profile": "1"}, sample_vehicle_excel_bytes)
+    assert r.status_code == 429
+    for profile in running:
+        profile.finish()
+
+    for _ in range(3):
+        r = _post_vehicles(client, {**api_headers, "X-Profile": "1"}, sample_vehicle_excel_bytes)
+        assert r.status_code == 200
+    assert len(list(tmp_path.iterdir())) == 2
+
+def _disconnected_export(api_headers, excel_bytes) -> list:
+    """POST /export straight through ASGI, with the client gone right after the upload."""
+    import asyncio
+    import httpx
+    from app.main import app
+
+    req = httpx.Request(
+        "POST", "http://testserver/export",
+        headers={**api_headers, "X-Profile": "1"},
+        files={"file": ("vehicles.xlsx", excel_bytes.getvalue(),
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        data={"sheet_name": "PRESENTACION 1", "output_format": "csv"},
+    )
+    body = req.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/export", "raw_path": b"/export", "root_path": "", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in req.headers.items()],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+    sent = []
+
+    async def receive():
+        return next(messages, {"type": "http.disconnect"})
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+def test_export_profile_released_when_client_disconnects(
+    client, api_headers, sample_vehicle_excel_bytes, tmp_path, monkeypatch
+):
+    from app.core import profiling
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    for _ in range(settings.PROFILE_MAX_CONCURRENT + 1):
+        sent = _disconnected_export(api_headers, sample_vehicle_excel_bytes)
+        assert not [m for m in sent if m["type"] == "http.response.body" and m.get("body")]
+
+    assert profiling._active._value == settings.PROFILE_MAX_CONCURRENT
+    assert len(list(tmp_path.glob("*.folded"))) == settings.PROFILE_MAX_CONCURRENT + 1
+    r = _post_vehicles(client, {**api_headers, "X-Profile": "1"}, sample_vehicle_excel_bytes)
+    assert r.status_code == 200
+
+def test_export_profile_header_requires_api_key(client, sample_vehicle_excel_bytes, tmp_path, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    r = _post_vehicles(client, {"X-Profile": "1"}, sample_vehicle_excel_bytes)
+    assert r.status_code in (401, 422)
+    assert not list(tmp_path.iterdir())
+
+def test_workbook_metadata_reports_sheets_and_header(client, api_headers):
+    df = pd.DataFrame(
+        [
+            {"TIPO DE UNIDAD": "TRACTO", "Desci.": "TR", "MOD": "2022", "NO.SERIE": "AAA"},
+            {"TIPO DE UNIDAD": "TANQUE", "Desci.": "TQ", "MOD": "2023", "NO.SERIE": "BBB"},
+        ]
+    )
+    out = BytesIO()
+    with pd.ExcelWriter(out, engine="openpyxl") as w:
+        df.to_excel(w, index=False, sheet_name="PRESENTACION 1", startrow=2)
+        pd.DataFrame([{"coberturas": "ROBO TOTAL", "LIMITES": "VALOR", "DEDUCIBLES": "10%"}]).to_excel(
+            w, index=False, sheet_name="COBERTURAS"
+        )
+
+    files = {"file": ("fleet.xlsx", out.getvalue(),
+                      "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    r = client.post("/workbook-metadata", headers=api_headers, files=files)
+    assert r.status_code == 200
+    sheets = r.json()["sheets"]
+    assert [s["name"] for s in sheets] == ["PRESENTACION 1", "COBERTURAS"]
+
+    vehicles = sheets[0]
+    assert vehicles["rows"] == 5 and vehicles["cols"] == 4
+    assert vehicles["header_row"] == 3
+    assert vehicles["header"] == ["TIPO DE UNIDAD", "Desci.", "MOD", "NO.SERIE"]
+    assert vehicles["data_rows"] == 2
+
+    cov = sheets[1]
+    assert cov["header_row"] == 1
+    assert cov["header"] == ["coberturas", "LIMITES", "DEDUCIBLES"]
+
+def test_workbook_metadata_sizes_sheet_without_dimension(client, api_headers):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("PRESENTACION 1")
+    ws.append(["TIPO DE UNIDAD", "Desci.", "MOD", "NO.SERIE", "PLACAS"])
+    for i in range(30_000):
+        ws.append(["TRACTO", f"UNIDAD {i}", "2022", f"SER{i:08d}", f"P{i:07d}"])
+    out = BytesIO()
+    wb.save(out)
+
+    files = {"file": ("big.xlsx", out.getvalue(),
+                      "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
+    r = client.post("/workbook-metadata", headers=api_headers, files=files)
+    assert r.status_code == 200
+    sheet = r.json()["sheets"][0]
+    assert sheet["dimension"] == ""
+    assert sheet["rows"] == 30_001 and sheet["cols"] == 5
+    assert sheet["data_rows"] == 30_000
+
+def test_workbook_metadata_rejects_non_xlsx(client, api_headers):
+    files = {"file": ("notes.txt", b"not a workbook", "text/plain")}
+    r = client.post("/workbook-metadata", headers=api_headers, files=files)
+    assert r.status_code == 400
@@ -0,0 +1,55 @@
+from __future__ import annotations
+import datetime
+from io import BytesIO
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app.services.excel_reader import read_sheet_strings
+
+
+@pytest.fixture()
+def messy_workbook() -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "PRESENTACION 1"
+    ws.append([None, None, "FLOTILLA"])
+    ws.append([])
+    ws.append(["TIPO DE UNIDAD", "MOD", "NO.SERIE", "VALOR"])
+    ws.append(["TRACTO", 2022, "A1", 1.5])
+    ws.append(["NA", 2023.0, True, datetime.datetime(2022, 1, 2)])
+    ws.append(["N/A", None, "=1/0", 1e20])
+    ws.append([None, None, None, None, "far"])
+    ws.append([" "])
+    ws["B20"] = "#N/A"  # error cell after a run of blank rows
+    for _ in range(5):
+        ws.append([])
+    wb.create_sheet("VACIA")
+    out = BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 3, 50_000])
+@pytest.mark.parametrize("sheet", ["PRESENTACION 1", "VACIA"])
+def test_read_sheet_strings_matches_read_excel(messy_workbook, sheet, chunk_rows):
+    xls = pd.ExcelFile(BytesIO(messy_workbook))
+    expected = pd.read_excel(xls, sheet_name=sheet, dtype=str, header=None)
+    got = read_sheet_strings(xls, sheet, chunk_rows=chunk_rows)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_chunked_read_writes_parquet(messy_workbook):
+    pq = pytest.importorskip("pyarrow.parquet")
+    from app.services.output_formats import iter_frame_chunks, iter_parquet
+    from app.services.transform_service import as_string_frame
+
+    xls = pd.ExcelFile(BytesIO(messy_workbook))
+    df = as_string_frame(read_sheet_strings(xls, "PRESENTACION 1", chunk_rows=3))
+    columns = [str(c) for c in df.columns]
+    # Slices crossing the reader's chunk boundaries.
+    data = b"".join(iter_parquet(iter_frame_chunks(df, chunk_rows=4), columns))
+    table = pq.read_table(BytesIO(data))
+    assert table.num_rows == len(df)
+    assert table.column("2").to_pylist()[:4] == ["FLOTILLA", "", "NO.SERIE", "A1"]
@@ -0,0 +1,29 @@
+from __future__ import annotations
+import json
+import pytest
+from app.services.json_stream import RowsStreamParser
+
+DOC = {
+    "note": 'braces {[ and "rows" inside a string',
+    "rows": [
+        {"idx": 0, "A": 'quote \" and } brace', "nested": {"x": [1, {"y": 2}]}},
+        {"idx": 1, "B": "ü\n"},
+    ],
+    "tail": {"rows": [{"idx": 9}]},
+}
+
+@pytest.mark.parametrize("step", [1, 2, 5, 13, 10_000])
+def test_rows_are_emitted_exactly_once_whatever_the_split(step):
+    text = json.dumps(DOC, indent=2)
+    parser = RowsStreamParser()
+    got = []
+    for i in range(0, len(text), step):
+        got.extend(parser.feed(text[i : i + step]))
+    assert got == DOC["rows"]
+    assert parser.close() == DOC
+
+def test_rows_are_emitted_before_the_document_ends():
+    parser = RowsStreamParser()
+    assert parser.feed('{"rows": [{"idx": 0, "A": "x"}, {"idx"') == [{"idx": 0, "A": "x"}]
+    assert parser.feed(': 1}') == [{"idx": 1}]
+    assert parser.close() is None
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from io import BytesIO
+from app.routers import export
+from app.services import output_formats
+from app.services.llm_router import EndpointPool
+from app.services.llm_service import LLMClient, SingleFlight, _INFLIGHT
+
+def test_llm_client_disabled_without_endpoints(sample_rules_dict):
+    llm = LLMClient(pool=EndpointPool([]))
+    assert llm.enabled is False
+    out = llm.transform_rows(sample_rules_dict, _fleet_rows(4))
+    assert llm.last_used_llm is False
+    assert out[0]["DANOS MATERIALES DEDUCIBLES"] == "10 %"
+
+def _fleet_rows(n: int = 30):
+    units = ["TRACTO", "TANQUE", "DOLLY", "tracto "]
+    return [
+        {"TIPO DE UNIDAD": units[i % len(units)], "Desci.": f"D{i}", "MOD": "2024", "NO.SERIE": f"S{i:04d}"}
+        for i in range(n)
+    ]
+
+def test_llm_path_enriches_rows_once_per_reference_value(stub_llm, stub_pool, sample_rules_dict):
+    llm = LLMClient(pool=stub_pool(stub_llm))
+    out = llm.transform_rows(sample_rules_dict, _fleet_rows())
+
+    assert llm.last_used_llm is True
+    assert stub_llm.calls == 1
+    # "TRACTO" and "tracto " normalize to the same key.
+    assert len(stub_llm.requests[0]["messages"][-1]["content"].split('"idx"')) - 1 == 3
+    assert out[0]["DANOS MATERIALES DEDUCIBLES"] == "10 %"
+    assert out[1]["ROBO TOTAL DEDUCIBLES"] == "5 %"
+    assert out[3]["DANOS MATERIALES LIMITES"] == "VALOR CONVENIDO"
+    assert out[5]["NO.SERIE"] == "S0005"
+    assert len(_INFLIGHT) == 0
+
+def test_concurrent_identical_exports_share_one_upstream_call(
+    client, api_headers, stub_llm, stub_pool, monkeypatch
+):
+    pool = stub_pool(stub_llm)
+    monkeypatch.setattr(export, "LLMClient", lambda: LLMClient(pool=pool))
+
+    df = pd.DataFrame(_fleet_rows(60))
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as w:
+        df.to_excel(w, index=False, sheet_name="PRESENTACION 1")
+    content = buf.getvalue()
+
+    n = 8
+    barrier = threading.Barrier(n)
+
+    def _export(_):
+        barrier.wait()
+        return client.post(
+            "/export",
+            headers=api_headers,
+            files={"file": ("fleet.xlsx", content, "application/octet-stream")},
+            data={"sheet_name": "PRESENTACION 1", "output_format": "csv"},
+        )
+
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        responses = list(executor.map(_export, range(n)))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses}) == 1
+    assert stub_llm.calls == 1
+    assert len(_INFLIGHT) == 0
+
+def test_single_flight_propagates_owner_error():
+    sf = SingleFlight()
+    calls, owned = sf.claim(["k"])
+    calls2, owned2 = sf.claim(["k"])
+    assert owned == ["k"] and owned2 == []
+    assert calls2["k"] is calls["k"]
+
+    sf.resolve("k", calls["k"], error=RuntimeError("boom"))
+    try:
+        calls2["k"].wait(1)
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("waiter should see the owner's error")
+    assert len(sf) == 0
+
+def test_streaming_mode_matches_buffered_mode(make_stub_llm, stub_pool, sample_rules_dict):
+    stub = make_stub_llm(piece_size=7)
+    rows = _fleet_rows(12)
+    buffered = LLMClient(pool=stub_pool(stub), stream=False).transform_rows(sample_rules_dict, rows)
+    streamed = LLMClient(pool=stub_pool(stub), stream=True).transform_rows(sample_rules_dict, rows)
+    assert streamed == buffered
+    assert [r.get("stream", False) for r in stub.requests] == [False, True]
+
+def test_streaming_retries_until_first_delta(make_stub_llm, stub_pool, sample_rules_dict):
+    stub = make_stub_llm(piece_size=7, fail_first=1)
+    rows = _fleet_rows(4)
+    llm = LLMClient(pool=stub_pool(stub), stream=True)
+    out = llm.transform_rows(sample_rules_dict, rows)
+
+    assert stub.calls == 2
+    assert llm.last_used_llm is True
+    assert out == LLMClient(pool=stub_pool(make_stub_llm(piece_size=7)), stream=False).transform_rows(
+        sample_rules_dict, rows
+    )
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_client_error_is_not_retried(make_stub_llm, stub_pool, sample_rules_dict, stream):
+    stub = make_stub_llm(fail_first=100, fail_status=400)
+    rows = _fleet_rows(4)
+    llm = LLMClient(pool=stub_pool(stub), stream=stream)
+    out = llm.transform_rows(sample_rules_dict, rows)
+
+    assert stub.calls == 1
+    assert llm.last_used_llm is False
+    assert out == LLMClient(pool=EndpointPool([])).transform_rows(sample_rules_dict, rows)
+
+def test_streamed_rows_are_released_before_completion_ends(make_stub_llm, stub_pool, sample_rules_dict):
+    stub = make_stub_llm(piece_size=8, piece_delay=0.02)
+    rows = [{"TIPO DE UNIDAD": u, "NO.SERIE": str(i)} for i, u in enumerate(["TRACTO", "TANQUE", "DOLLY"])]
+    llm = LLMClient(pool=stub_pool(stub), stream=True)
+
+    first_batch_at = None
+    out = []
+    for batch in llm.iter_transform_batches(sample_rules_dict, rows):
+        if first_batch_at is None:
+            first_batch_at = time.perf_counter()
+        out.extend(batch)
+
+    assert [r["NO.SERIE"] for r in out] == ["0", "1", "2"]
+    assert out[1]["ROBO TOTAL DEDUCIBLES"] == "5 %"
+    assert llm.last_used_llm is True
+    assert stub.calls == 1
+    deadline = time.time() + 5
+    while not stub.finished_at and time.time() < deadline:
+        time.sleep(0.01)
+    assert first_batch_at < stub.finished_at[0]
+
+def test_streaming_export_writes_same_csv_as_fallback(
+    client, api_headers, make_stub_llm, stub_pool, sample_vehicle_excel_bytes, monkeypatch
+):
+    files = {"file": ("vehicles.xlsx", sample_vehicle_excel_bytes.getvalue(), "application/octet-stream")}
+    data = {"sheet_name": "PRESENTACION 1", "output_format": "csv"}
+    baseline = client.post("/export", headers=api_headers, files=files, data=data)
+
+    pool = stub_pool(make_stub_llm(piece_size=5))
+    monkeypatch.setattr(export, "LLMClient", lambda: LLMClient(pool=pool, stream=True))
+    streamed = client.post("/export", headers=api_headers, files=files, data=data)
+
+    assert streamed.status_code == 200
+    assert streamed.content == baseline.content
+
+def test_streaming_parquet_export_keeps_full_row_groups(
+    client, api_headers, make_stub_llm, stub_pool, monkeypatch
+):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    units = [f"TRACTO {i}" for i in range(150)] + [f"REMOLQUE {i}" for i in range(150)]
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as w:
+        pd.DataFrame({"TIPO DE UNIDAD": units, "NO.SERIE": [str(i) for i in range(300)]}).to_excel(
+            w, index=False, sheet_name="PRESENTACION 1"
+        )
+    files = {"file": ("fleet.xlsx", buf.getvalue(), "application/octet-stream")}
+
+    pool = stub_pool(make_stub_llm(piece_size=5))
+    monkeypatch.setattr(export, "LLMClient", lambda: LLMClient(pool=pool, stream=True))
+    monkeypatch.setattr(output_formats, "IPC_FLUSH_S", 60.0)
+    parquet = client.post("/export", headers=api_headers, files=files,
+                          data={"sheet_name": "PRESENTACION 1", "output_format": "parquet"})
+    arrow = client.post("/export", headers=api_headers, files=files,
+                        data={"sheet_name": "PRESENTACION 1", "output_format": "arrow"})
+
+    pf = pq.ParquetFile(BytesIO(parquet.content))
+    assert pf.metadata.num_rows == 300
+    assert pf.metadata.num_row_groups == 1
+    reader = pa.ipc.open_stream(arrow.content)
+    batches = list(reader)
+    assert len(batches) == 1 and batches[0].num_rows == 300
+
+def test_arrow_ipc_flushes_buffered_rows_while_source_waits(monkeypatch):
+    import pyarrow as pa
+
+    monkeypatch.setattr(output_formats, "IPC_FLUSH_S", 0.05)
+    release = threading.Event()
+
+    def frames():
+        yield pd.DataFrame({"A": ["1", "2"]})
+        release.wait(5)  # e.g. the next LLM completion
+        yield pd.DataFrame({"A": ["3"]})
+
+    out = output_formats.iter_arrow_ipc(frames(), ["A"])
+    first = next(out)
+    sent_before_source_resumed = not release.is_set()
+    release.set()
+    batches = list(pa.ipc.open_stream(first + b"".join(out)))
+
+    assert sent_before_source_resumed
+    assert [b.num_rows for b in batches] == [2, 1]
@@ -0,0 +1,103 @@
+from __future__ import annotations
+import threading
+import time
+
+from app.services import llm_router
+from app.services.llm_router import HealthMonitor
+
+PING = [{"role": "user", "content": "ping"}]
+
+def _wait_for(cond, timeout: float = 3.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return cond()
+
+def test_routes_to_fastest_healthy_endpoint(make_stub_llm, stub_pool):
+    slow, fast = make_stub_llm(delay=0.2), make_stub_llm(delay=0.0)
+    pool = stub_pool(slow, fast)
+    pool.probe_all()
+    assert pool.ranked()[0].name == "stub-1"
+
+    slow.reset(); fast.reset()
+    for _ in range(3):
+        pool.create(messages=PING)
+    assert fast.calls == 3 and slow.calls == 0
+
+def test_fails_over_and_marks_dead_endpoint_unhealthy(make_stub_llm, stub_pool):
+    dead, live = make_stub_llm(), make_stub_llm()
+    pool = stub_pool(dead, live)
+    dead.stop()
+
+    for _ in range(3):
+        resp = pool.create(messages=PING)
+        assert resp.choices[0].message.content
+    dead_ep = pool.endpoints[0]
+    assert not dead_ep.healthy
+    assert dead_ep.last_error
+    assert pool.ranked()[0] is pool.endpoints[1]
+    assert live.calls == 3
+
+def test_client_errors_do_not_fail_over_or_mark_endpoints_unhealthy(make_stub_llm, stub_pool):
+    import openai
+    import pytest
+
+    a, b = make_stub_llm(fail_first=100, fail_status=400), make_stub_llm(fail_first=100, fail_status=400)
+    pool = stub_pool(a, b)
+
+    for _ in range(llm_router._UNHEALTHY_STREAK):
+        with pytest.raises(openai.BadRequestError):
+            pool.create(messages=PING)
+        with pytest.raises(openai.BadRequestError):
+            list(pool.stream(messages=PING))
+    assert a.calls + b.calls == 2 * llm_router._UNHEALTHY_STREAK
+    assert min(a.calls, b.calls) == 0  # never failed over
+    assert all(ep.healthy and ep.failure_streak == 0 and not ep.last_error for ep in pool.endpoints)
+
+def test_respects_per_endpoint_concurrency_cap(make_stub_llm, stub_pool):
+    a, b = make_stub_llm(delay=0.3), make_stub_llm(delay=0.3)
+    pool = stub_pool(a, b, max_concurrency=1)
+
+    barrier = threading.Barrier(2)
+
+    def _call():
+        barrier.wait()
+        pool.create(messages=PING)
+
+    threads = [threading.Thread(target=_call) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert a.calls == 1 and b.calls == 1
+    assert all(ep.in_flight == 0 for ep in pool.endpoints)
+
+def test_llm_status_reports_cached_health_without_probing(client, make_stub_llm, stub_pool, monkeypatch):
+    stub = make_stub_llm()
+    monkeypatch.setattr(llm_router, "_pool", stub_pool(stub))
+
+    r = client.get("/llm/status")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["enabled"] is True and body["probed"] is False
+    assert body["endpoints"][0]["name"] == "stub-0"
+    assert stub.calls == 0
+
+    r = client.get("/llm/status", params={"probe": "true"})
+    assert r.status_code == 200
+    assert _wait_for(lambda: client.get("/llm/status").json()["probed"])
+    body = client.get("/llm/status").json()
+    assert body["ok"] is True
+    assert body["endpoints"][0]["latency_ms"] is not None
+
+def test_health_monitor_probes_in_background(make_stub_llm, stub_pool):
+    stub = make_stub_llm()
+    pool = stub_pool(stub)
+    monitor = HealthMonitor(pool, interval_s=0.05).start()
+    try:
+        assert _wait_for(lambda: stub.calls >= 2)
+    finally:
+        monitor.stop()
+    assert pool.endpoints[0].last_checked is not None
@@ -0,0 +1,66 @@
+from __future__ import annotations
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.main import app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def test_importing_app_does_not_load_heavy_modules():
+    code = (
+        "import json, sys, app.main; "
+        "print(json.dumps([m for m in ('pandas', 'numpy', 'openpyxl', 'pyarrow', 'openai') if m in sys.modules]))"
+    )
+    env = {**os.environ, "BACKEND_API_KEY": "test-key"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
+
+def test_lifespan_builds_llm_pool_off_the_event_loop():
+    code = (
+        "import json, os, sys, time\n"
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "from app.services import llm_router\n"
+        "with TestClient(app) as c:\n"
+        "    c.get('/health')\n"
+        "    at_startup = 'openai' in sys.modules\n"
+        "    deadline = time.time() + (10 if float(os.environ['LLM_HEALTH_INTERVAL_S']) > 0 else 0)\n"
+        "    while llm_router._pool is None and time.time() < deadline:\n"
+        "        time.sleep(0.02)\n"
+        "    print(json.dumps([at_startup, llm_router._pool is not None]))\n"
+    )
+    env = {**os.environ, "BACKEND_API_KEY": "test-key", "OPENAI_API_KEY": "sk-test",
+           "OPENAI_BASE_URL": "http://127.0.0.1:9/v1", "LLM_PROBE_TIMEOUT_S": "0.5"}
+
+    def run(interval: str) -> list:
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR,
+                             env={**env, "LLM_HEALTH_INTERVAL_S": interval},
+                             capture_output=True, text=True, check=True, timeout=60)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    # Monitor disabled: nothing builds the pool (or imports openai) at startup.
+    at_startup, built = run("0")
+    assert at_startup is False and built is False
+    # Monitor enabled: the pool is built on the monitor thread.
+    assert run("30")[1] is True
+
+def test_ready_waits_for_warm_up(monkeypatch):
+    monkeypatch.setattr(main.settings, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setitem(main._startup, "ready", False)
+    with TestClient(app) as c:
+        deadline = time.time() + 10
+        while c.get("/ready").status_code != 200 and time.time() < deadline:
+            time.sleep(0.05)
+        r = c.get("/ready")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ready"] is True and body["error"] == ""
+    assert body["warmup_ms"] is not None
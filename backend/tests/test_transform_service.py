@@ -5,6 +5,12 @@ from app.services.transform_service import (
     records_to_df,
     order_df_by_rules,
     transform_rows_local,
+    as_string_frame,
+    drop_blank_rows,
+    reference_codes,
+    attach_coverages,
+    STRING_DTYPE,
+    CATEGORY_MIN_ROWS,
 )
 
 def test_local_transform_adds_expected_columns(sample_rules_dict):
@@ -46,3 +52,35 @@ def test_order_df_by_rules_inserts_after_no_serie(sample_rules_dict):
         "ROBO TOTAL LIMITES",
         "ROBO TOTAL DEDUCIBLES",
     ]
+
+def test_as_string_frame_uses_arrow_strings_and_categoricals():
+    n = CATEGORY_MIN_ROWS * 2
+    df = pd.DataFrame({
+        "TIPO DE UNIDAD": ["TRACTO" if i % 2 else "TANQUE" for i in range(n)],
+        "NO.SERIE": [f"S{i}" for i in range(n)],
+        "MOD": [None] * n,
+    })
+    out = as_string_frame(df)
+    assert isinstance(out["TIPO DE UNIDAD"].dtype, pd.CategoricalDtype)
+    assert str(out["TIPO DE UNIDAD"].cat.categories.dtype) == "string"
+    assert out["NO.SERIE"].dtype == STRING_DTYPE
+    assert (out["MOD"] == "").all()
+
+def test_drop_blank_rows_ignores_whitespace_and_missing():
+    df = pd.DataFrame({"A": ["x", " ", None, ""], "B": ["", None, "  ", "y"]})
+    out = drop_blank_rows(df)
+    assert out["A"].fillna("").tolist() == ["x", ""]
+    assert out["B"].fillna("").tolist() == ["", "y"]
+
+def test_attach_coverages_maps_representatives_back_by_code(sample_rules_dict):
+    df = as_string_frame(pd.DataFrame({
+        "TIPO DE UNIDAD": ["TANQUE", "TRACTO", "TANQUE", "DOLLY", "TRACTO"],
+        "NO.SERIE": ["A", "B", "C", "D", "E"],
+    }))
+    codes, reps = reference_codes(df, "TIPO DE UNIDAD")
+    assert [r["TIPO DE UNIDAD"] for r in reps] == ["TANQUE", "TRACTO", "DOLLY"]
+
+    out = attach_coverages(df, codes, transform_rows_local(sample_rules_dict, reps))
+    assert out["DANOS MATERIALES DEDUCIBLES"].astype(str).tolist() == ["5 %", "10 %", "5 %", "10 %", "10 %"]
+    assert isinstance(out["ROBO TOTAL LIMITES"].dtype, pd.CategoricalDtype)
+    assert "DANOS MATERIALES LIMITES" not in df.columns